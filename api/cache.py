@@ -0,0 +1,265 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlencode
+
+from database.invalidation import INVALIDATION_CHANNEL, POPULAR_TAG, USER_TAG_PREFIX, user_tag
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_TAG = "recommendations"
+
+
+class MemoryBackend:
+    """
+    In-process LRU with per-entry TTL and tag-based invalidation.
+
+    Also serves as the local stand-in for the shared backend.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()          # key -> (expires_at, value, tags)
+        self._tags = defaultdict(set)          # tag -> keys
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key, (None, None, ()))
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """Shared backend across API workers; values are stored as JSON"""
+
+    def __init__(self, url: str, prefix: str = "grrec:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, max(1, int(ttl)))
+        pipe.execute()
+
+    def invalidate(self, tag: str) -> int:
+        tag_key = f"{self.prefix}tag:{tag}"
+        keys = [k.decode() for k in self.client.smembers(tag_key)]
+        self.client.delete(tag_key, *[self.prefix + k for k in keys])
+        return len(keys)
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+    def publish(self, tag: str):
+        self.client.publish(INVALIDATION_CHANNEL, tag)
+
+    def subscribe(self, callback: Callable[[str], None]):
+        """Call callback(tag) from a daemon thread for every published invalidation"""
+        def run():
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+                    for message in pubsub.listen():
+                        callback(message["data"].decode())
+                except Exception as e:
+                    # messages sent while disconnected are lost; entries expire by TTL
+                    logger.warning(f"Invalidation subscription failed: {e}; reconnecting")
+                    time.sleep(1)
+
+        threading.Thread(target=run, name="cache-invalidation", daemon=True).start()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: a small in-process LRU in front of an optional
+    shared backend.
+
+    Entries are tagged so they can be dropped explicitly (see invalidate).
+    With a Redis shared tier, invalidations are also broadcast to every
+    process that called listen(), including those published by writers
+    outside the API (database.invalidation). The local tier keeps a short
+    TTL as a bound for broadcasts lost while a subscriber reconnects, and
+    for deployments without a shared tier, where only TTLs apply.
+    """
+
+    def __init__(self, local: Optional[MemoryBackend] = None, shared=None, local_ttl: float = 30.0):
+        self.local = local or MemoryBackend()
+        self.shared = shared
+        self.local_ttl = local_ttl
+        self._listeners: List[Callable[[str], None]] = []
+        self._stats = defaultdict(lambda: {"hits": 0, "local_hits": 0, "misses": 0})
+
+    @staticmethod
+    def make_key(namespace: str, params: Dict[str, Any]) -> str:
+        """Deterministic key over every query parameter"""
+        return f"{namespace}?{urlencode(sorted(params.items()))}"
+
+    def get(self, namespace: str, params: Dict[str, Any]) -> Optional[Any]:
+        key = self.make_key(namespace, params)
+        stats = self._stats[namespace]
+
+        value = self.local.get(key)
+        if value is not None:
+            stats["hits"] += 1
+            stats["local_hits"] += 1
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"Shared cache get failed for {key}: {e}")
+                value = None
+            if not isinstance(value, dict) or "tags" not in value:
+                value = None  # missing, or written before entries carried their tags
+            if value is not None:
+                stats["hits"] += 1
+                # keep the tags, so invalidations also reach the local copy
+                self.local.set(key, value["value"], self.local_ttl, value["tags"])
+                return value["value"]
+
+        stats["misses"] += 1
+        return None
+
+    def set(self, namespace: str, params: Dict[str, Any], value: Any, ttl: float, tags: Iterable[str] = ()):
+        key = self.make_key(namespace, params)
+        tags = (namespace,) + tuple(tags)
+        local_ttl = ttl if self.shared is None else min(ttl, self.local_ttl)
+        self.local.set(key, value, local_ttl, tags)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, {"value": value, "tags": list(tags)}, ttl, tags)
+            except Exception as e:
+                logger.warning(f"Shared cache set failed for {key}: {e}")
+
+    async def aget(self, namespace: str, params: Dict[str, Any]) -> Optional[Any]:
+        """get() for async handlers: shared-tier I/O runs off the event loop"""
+        if self.shared is None:
+            return self.get(namespace, params)
+        return await asyncio.to_thread(self.get, namespace, params)
+
+    async def aset(self, namespace: str, params: Dict[str, Any], value: Any, ttl: float, tags: Iterable[str] = ()):
+        if self.shared is None:
+            return self.set(namespace, params, value, ttl, tags)
+        await asyncio.to_thread(self.set, namespace, params, value, ttl, tags)
+
+    def invalidate(self, tag: str, broadcast: bool = True) -> int:
+        """Drop every entry carrying tag from both tiers, notify listeners and (optionally) other processes"""
+        dropped = self.local.invalidate(tag)
+        if self.shared is not None:
+            try:
+                dropped += self.shared.invalidate(tag)
+            except Exception as e:
+                logger.warning(f"Shared cache invalidate failed for {tag}: {e}")
+        for listener in self._listeners:
+            listener(tag)
+        if broadcast and hasattr(self.shared, "publish"):
+            try:
+                self.shared.publish(tag)
+            except Exception as e:
+                logger.warning(f"Invalidation broadcast failed for {tag}: {e}")
+        logger.info(f"Invalidated {dropped} cache entries for {tag}")
+        return dropped
+
+    def listen(self) -> bool:
+        """
+        Apply invalidations broadcast by other processes. Returns False when
+        the shared tier cannot deliver them (no CACHE_URL).
+        """
+        if not hasattr(self.shared, "subscribe"):
+            logger.warning("No shared cache tier: invalidations from other processes are not received")
+            return False
+        self.shared.subscribe(lambda tag: self.invalidate(tag, broadcast=False))
+        return True
+
+    def add_listener(self, listener: Callable[[str], None]):
+        """Call listener(tag) on every invalidation (e.g. to drop derived in-process state)"""
+        self._listeners.append(listener)
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, s in self._stats.items():
+            total = s["hits"] + s["misses"]
+            namespaces[namespace] = {**s, "hit_rate": s["hits"] / total if total else 0.0}
+        return {
+            "local_entries": len(self.local),
+            "shared": self.shared is not None,
+            "namespaces": namespaces,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> ResponseCache:
+    """
+    Process-wide cache. CACHE_URL (e.g. redis://localhost:6379/0) enables the
+    shared tier and cross-process invalidation; without it the cache is
+    in-process only.
+    """
+    url = os.getenv("CACHE_URL")
+    shared = RedisBackend(url) if url else None
+    return ResponseCache(
+        local=MemoryBackend(maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "10000"))),
+        shared=shared,
+        local_ttl=float(os.getenv("CACHE_LOCAL_TTL", "30")),
+    )
+
@@ -1,11 +1,84 @@
 # api/main.py
-from fastapi import FastAPI, Query
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, List
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from modeling.recommend import topn
-from sqlalchemy import create_engine, text
-import os, pandas as pd
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.exc import SQLAlchemyError
+from api.cache import POPULAR_TAG, RECOMMENDATIONS_TAG, USER_TAG_PREFIX, get_cache, user_tag
+from database.pool import create_pool, fetch_popular, fetch_user_history, fetch_users_history, query
+from modeling.batching import MicroBatcher, Overloaded
+from modeling.recommend import get_recommender
+from modeling.similarity import SIMILAR_DIR, SimilarIndex
 
-app = FastAPI(title="Goodreads Recommender")
+logger = logging.getLogger(__name__)
+
+# popularity counters move with every upsert; a short TTL bounds staleness
+POPULAR_TTL = float(os.getenv("POPULAR_CACHE_TTL", "60"))
+RECOMMENDATIONS_TTL = float(os.getenv("RECOMMENDATIONS_CACHE_TTL", "600"))
+
+# request budgets (seconds)
+RECOMMENDATIONS_TIMEOUT = float(os.getenv("RECOMMENDATIONS_TIMEOUT", "2"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "2"))
+
+# largest n any endpoint returns
+MAX_RESULTS = int(os.getenv("MAX_RESULTS", "1000"))
+
+# bulk endpoint limits
+BULK_MAX_USERS = int(os.getenv("BULK_MAX_USERS", "100000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "256"))
+bulk_slots = asyncio.Semaphore(int(os.getenv("BULK_MAX_CONCURRENT", "2")))
+
+
+class BulkRecommendationsRequest(BaseModel):
+    user_ids: List[str]
+    n: int = Field(20, ge=1, le=MAX_RESULTS)
+    candidate_cap: int = Field(20000, ge=1)
+    min_pop: int = Field(50, ge=0)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pool per process, shared by all requests; an unknown DB_SCHEMA fails here
+    query("popular")
+    app.state.db = create_pool()
+
+    # concurrent /recommendations calls are scored together in one matmul
+    recommender = get_recommender()
+
+    # an upserted user's fold-in embedding is recomputed on their next request;
+    # listen() below delivers the scraper's invalidate_user here from other processes
+    def forget_user(tag: str):
+        if tag.startswith(USER_TAG_PREFIX):
+            recommender.forget(tag[len(USER_TAG_PREFIX):])
+    get_cache().add_listener(forget_user)
+
+    # apply invalidations published by scrapers, reconcile and other workers
+    get_cache().listen()
+
+    app.state.batcher = MicroBatcher(
+        recommender.topn_batch,
+        max_batch=int(os.getenv("BATCH_MAX_SIZE", "64")),
+        max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "2")),
+        queue_size=int(os.getenv("BATCH_QUEUE_SIZE", "1024")),
+        workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+    )
+    await app.state.batcher.start()
+
+    # optional: /books/{id}/similar answers 503 until an index is built
+    app.state.similar = SimilarIndex(SIMILAR_DIR, check_interval=float(os.getenv("SIMILAR_RELOAD_INTERVAL", "30")))
+    app.state.similar.get()
+    yield
+    await app.state.batcher.stop()
+    await app.state.db.dispose()
+
+
+app = FastAPI(title="Goodreads Recommender", lifespan=lifespan)
 
 # allow local frontends
 app.add_middleware(
@@ -13,39 +86,141 @@ app.add_middleware(
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
+# failed database calls: timeouts answer 504, anything else 503
+DB_ERRORS = (asyncio.TimeoutError, SQLAlchemyError, OSError)
+
+def database_error(e: Exception) -> HTTPException:
+    if isinstance(e, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail="database timed out")
+    return HTTPException(status_code=503, detail="database unavailable")
+
 @app.get("/health")
-def health(): return {"status": "ok"}
+async def health(): return {"status": "ok"}
+
+async def fold_in_user(request: Request, user_id: str):
+    """Fold in users added or changed since training, at most once per FOLDIN_TTL"""
+    recommender = get_recommender()
+    if not recommender.needs_fold_in(user_id):
+        return
+    try:
+        history = await asyncio.wait_for(
+            fetch_user_history(request.app.state.db, user_id), timeout=DB_TIMEOUT
+        )
+    except DB_ERRORS as e:
+        # known users fall back to their trained embedding
+        if user_id not in recommender.user_to_idx:
+            raise database_error(e)
+        logger.warning(f"History lookup for {user_id} failed, using trained embedding: {e!r}")
+        return
+    recommender.fold_in(user_id, history)
 
 @app.get("/recommendations")
-def recommendations(
-    user_id: str, n: int = 20, candidate_cap: int = 20000, min_pop: int = 50
+async def recommendations(
+    request: Request,
+    user_id: str,
+    n: int = Query(20, ge=1, le=MAX_RESULTS),
+    candidate_cap: int = Query(20000, ge=1),
+    min_pop: int = Query(50, ge=0),
 ):
-    return {"user_id": user_id, "results": topn(user_id, n=n,
-                                                candidate_cap=candidate_cap,
-                                                min_pop=min_pop)}
+    cache = get_cache()
+    params = {"user_id": user_id, "n": n, "candidate_cap": candidate_cap, "min_pop": min_pop}
+    cached = await cache.aget(RECOMMENDATIONS_TAG, params)
+    if cached is not None:
+        return cached
+
+    await fold_in_user(request, user_id)
+    try:
+        results = await request.app.state.batcher.submit(
+            (user_id, n, candidate_cap, min_pop), timeout=RECOMMENDATIONS_TIMEOUT
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown user_id {user_id}; use /popular")
+    except Overloaded:
+        raise HTTPException(status_code=503, detail="overloaded", headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="recommendation timed out")
+
+    response = {"user_id": user_id, "results": results}
+    await cache.aset(RECOMMENDATIONS_TAG, params, response, RECOMMENDATIONS_TTL, tags=[user_tag(user_id)])
+    return response
+
+async def fetch_fold_in_histories(request: Request, user_ids: List[str]) -> Dict[str, list]:
+    """
+    Histories of the user_ids that need fold-in, in one query. On a database
+    error nobody is folded in: known users keep their trained embedding and
+    unknown ones are reported as such.
+    """
+    recommender = get_recommender()
+    pending = [u for u in dict.fromkeys(user_ids) if recommender.needs_fold_in(u)]
+    if not pending:
+        return {}
+    try:
+        return await asyncio.wait_for(
+            fetch_users_history(request.app.state.db, pending), timeout=DB_TIMEOUT
+        )
+    except DB_ERRORS as e:
+        logger.warning(f"History lookup for {len(pending)} bulk users failed, skipping fold-in: {e!r}")
+        return {}
+
+@app.post("/recommendations/bulk")
+async def bulk_recommendations(request: Request, body: BulkRecommendationsRequest):
+    """Stream NDJSON, one {"user_id", "results"} line per user, in input order"""
+    if len(body.user_ids) > BULK_MAX_USERS:
+        raise HTTPException(status_code=413, detail=f"at most {BULK_MAX_USERS} user_ids per request")
+
+    recommender = get_recommender()
+
+    def fold_in_and_score(chunk: List[str], histories: Dict[str, list]) -> List[Dict]:
+        for user_id, history in histories.items():
+            recommender.fold_in(user_id, history)
+        return recommender.topn_chunk(chunk, n=body.n, candidate_cap=body.candidate_cap, min_pop=body.min_pop)
+
+    async def stream():
+        # a chunk is fetched and computed only once the previous one has been sent
+        async with bulk_slots:
+            for start in range(0, len(body.user_ids), BULK_CHUNK_SIZE):
+                chunk = body.user_ids[start:start + BULK_CHUNK_SIZE]
+                histories = await fetch_fold_in_histories(request, chunk)
+                rows = await asyncio.to_thread(fold_in_and_score, chunk, histories)
+                yield "".join(json.dumps(row) + "\n" for row in rows)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/books/{book_id}/similar")
+async def similar(request: Request, book_id: str, n: int = Query(20, ge=1)):
+    index = request.app.state.similar.get()
+    if index is None:
+        raise HTTPException(status_code=503, detail="similar-books index not built")
+    try:
+        results = index.similar(book_id, n=n)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown book_id {book_id}")
+    return {"book_id": book_id, "results": results}
 
 # cold-start fallback
 @app.get("/popular")
-def popular(n: int = 20, min_pop: int = 200):
-    engine = create_engine(
-        f"postgresql+psycopg2://{os.getenv('PGUSER','postgres')}:"
-        f"{os.getenv('PGPASSWORD','ZippyKiko88')}"
-        f"@{os.getenv('PGHOST','localhost')}:{os.getenv('PGPORT','5432')}/"
-        f"{os.getenv('PGDATABASE','goodreads')}",
-        pool_pre_ping=True,
-    )
-    with engine.begin() as conn:
-        ids = pd.read_sql_query(
-            text("""
-                SELECT book_id
-                FROM mv_popular_items
-                WHERE n_ratings >= :min_pop
-                ORDER BY n_ratings DESC
-                LIMIT :n
-            """), conn, params={"min_pop": min_pop, "n": n}
-        )["book_id"].tolist()
-        meta = pd.read_sql_query(
-            text("SELECT book_id, title, image_url FROM book_metadata WHERE book_id = ANY(:ids)"),
-            conn, params={"ids": ids}
+async def popular(
+    request: Request, n: int = Query(20, ge=1, le=MAX_RESULTS), min_pop: int = Query(200, ge=0)
+):
+    cache = get_cache()
+    params = {"n": n, "min_pop": min_pop}
+    cached = await cache.aget(POPULAR_TAG, params)
+    if cached is not None:
+        return cached
+
+    try:
+        results = await asyncio.wait_for(
+            fetch_popular(request.app.state.db, n=n, min_pop=min_pop), timeout=DB_TIMEOUT
         )
-    return {"results": meta.to_dict(orient="records")}
+    except DB_ERRORS as e:
+        raise database_error(e)
+
+    response = {"results": results}
+    await cache.aset(POPULAR_TAG, params, response, POPULAR_TTL)
+    return response
+
+@app.get("/cache/stats")
+async def cache_stats(): return get_cache().stats()
+
+@app.get("/batcher/stats")
+async def batcher_stats(request: Request): return request.app.state.batcher.stats()
@@ -0,0 +1,100 @@
+"""
+Training speed and accuracy of modeling.als.ALS against the surprise SVD
+baseline from two_tower.ipynb, on synthetic low-rank ratings.
+
+    python -m benchmarks.als_vs_surprise --users 20000 --books 10000 --ratings 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import polars as pl
+
+from modeling.als import ALS
+
+
+def make_ratings(num_users: int, num_books: int, num_ratings: int, rank: int = 8, seed: int = 42) -> pl.DataFrame:
+    """1-5 ratings from a low-rank model plus noise, deduplicated on (user_id, book_id)"""
+    rng = np.random.default_rng(seed)
+    U = rng.standard_normal((num_users, rank))
+    V = rng.standard_normal((num_books, rank))
+    users = rng.integers(0, num_users, num_ratings)
+    books = rng.integers(0, num_books, num_ratings)
+    signal = (U[users] * V[books]).sum(axis=1) / np.sqrt(rank)
+    ratings = np.clip(np.round(3.6 + signal + rng.normal(0, 0.5, num_ratings)), 1, 5).astype(np.int64)
+
+    return pl.DataFrame({
+        "user_id": users.astype(str),
+        "book_id": books.astype(str),
+        "rating": ratings,
+    }).unique(subset=["user_id", "book_id"], keep="first")
+
+
+def split(df: pl.DataFrame, test_size: float = 0.1, seed: int = 42):
+    df = df.sample(fraction=1.0, shuffle=True, seed=seed)
+    cut = int(len(df) * (1 - test_size))
+    return df[:cut], df[cut:]
+
+
+def run_als(train: pl.DataFrame, test: pl.DataFrame, args) -> dict:
+    start = time.perf_counter()
+    model = ALS(
+        factors=args.factors, regularization=args.als_reg,
+        iterations=args.als_iterations, workers=args.workers,
+    ).fit(train)
+    fit_s = time.perf_counter() - start
+    return {"model": "als", "fit_s": fit_s, **model.evaluate(test)}
+
+
+def run_surprise(train: pl.DataFrame, test: pl.DataFrame, args) -> dict:
+    try:
+        from surprise import Dataset, Reader, SVD, accuracy
+    except ImportError:
+        return {"model": "surprise_svd", "skipped": "scikit-surprise not installed"}
+
+    # Same preparation and hyperparameters as train_svd_baseline
+    reader = Reader(rating_scale=(1, 5))
+    trainset = Dataset.load_from_df(train.to_pandas(), reader).build_full_trainset()
+    testset = list(test.iter_rows())
+
+    start = time.perf_counter()
+    model = SVD(n_factors=args.factors, n_epochs=20, lr_all=0.005, reg_all=0.02)
+    model.fit(trainset)
+    fit_s = time.perf_counter() - start
+
+    predictions = model.test(testset)
+    return {
+        "model": "surprise_svd",
+        "fit_s": fit_s,
+        "rmse": float(accuracy.rmse(predictions, verbose=False)),
+        "mae": float(accuracy.mae(predictions, verbose=False)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--als-iterations", type=int, default=10)
+    parser.add_argument("--als-reg", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    train, test = split(make_ratings(args.users, args.books, args.ratings, seed=args.seed), seed=args.seed)
+    results = [run_als(train, test, args), run_surprise(train, test, args)]
+
+    print(json.dumps({
+        "benchmark": "als_vs_surprise",
+        "config": vars(args),
+        "train_ratings": len(train),
+        "test_ratings": len(test),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+End-to-end load benchmark for the API: seeds a database and a model artifact
+with synthetic data, starts api.main under uvicorn, drives /recommendations
+and /popular at fixed concurrency levels and reports throughput and latency
+percentiles as JSON.
+
+    python -m benchmarks.api_load --interactions 1000000 --concurrency 1 8 32 --out load.json
+    python -m benchmarks.api_load --interactions 1000000 --compare load.json
+
+The default database is a SQLite file in the work directory. Pass
+--database-url postgresql+asyncpg://... with --reset-db to use a scratch
+Postgres database instead. Seeding drops and recreates the tables it
+fills there.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+import polars as pl
+from sqlalchemy import Column, Float, Integer, MetaData, Table, Text
+
+from benchmarks.synthetic import make_artifacts, make_interactions
+from benchmarks.topn_latency import percentiles
+from database.pool import create_pool
+from modeling.artifacts import save_artifacts
+
+# Only the tables and columns the API reads
+metadata = MetaData()
+interactions_table = Table(
+    "interactions", metadata,
+    Column("user_id", Text, primary_key=True),
+    Column("book_id", Text, primary_key=True),
+    Column("user_rating", Integer),
+)
+book_counts_table = Table(
+    "book_interaction_counts", metadata,
+    Column("book_id", Text, primary_key=True),
+    Column("n_ratings", Integer, nullable=False, index=True),
+)
+user_counts_table = Table(
+    "user_interaction_counts", metadata,
+    Column("user_id", Text, primary_key=True),
+    Column("n_interactions", Integer, nullable=False),
+)
+book_metadata_table = Table(
+    "book_metadata", metadata,
+    Column("book_id", Text, primary_key=True),
+    Column("title", Text),
+    Column("image_url", Text),
+    Column("average_rating", Float),
+)
+
+INSERT_BATCH = 50_000
+
+
+def git_commit():
+    """HEAD and whether the tree has uncommitted changes, so reports can be matched to commits"""
+    try:
+        head = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True))
+        return {"commit": head, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def seed_database(url: str, interactions: pl.DataFrame, book_metadata: pl.DataFrame):
+    """
+    Recreate the tables and load them. Counters are written directly, as
+    database.reconcile would leave them.
+    """
+    book_counts = interactions.group_by("book_id").agg(pl.len().alias("n_ratings"))
+    user_counts = interactions.group_by("user_id").agg(pl.len().alias("n_interactions"))
+    rows = {
+        interactions_table: interactions.select(["user_id", "book_id", pl.col("rating").alias("user_rating")]),
+        book_counts_table: book_counts,
+        user_counts_table: user_counts,
+        book_metadata_table: book_metadata,
+    }
+
+    engine = create_pool(url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+            await conn.run_sync(metadata.create_all)
+        for table, df in rows.items():
+            for start in range(0, len(df), INSERT_BATCH):
+                async with engine.begin() as conn:
+                    await conn.execute(table.insert(), df[start:start + INSERT_BATCH].to_dicts())
+    finally:
+        await engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, model_dir: str, database_url: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "MODEL_DIR": model_dir, "DATABASE_URL": database_url}
+    if args.no_cache:
+        env.pop("CACHE_URL", None)
+        env.update(POPULAR_CACHE_TTL="0", RECOMMENDATIONS_CACHE_TTL="0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API server exited with code {proc.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("API server did not become ready")
+
+
+async def drive(client: httpx.AsyncClient, make_request, concurrency: int, total: int) -> dict:
+    """Send total requests from concurrency workers; latency is measured per request"""
+    samples, statuses = [], Counter()
+    remaining = iter(range(total))
+
+    async def worker():
+        for i in remaining:
+            path, params = make_request(i)
+            t0 = time.perf_counter()
+            try:
+                status = (await client.get(path, params=params)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples.append((time.perf_counter() - t0) * 1000)
+            statuses[str(status)] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": total - statuses.get("200", 0),
+        "status_counts": dict(statuses),
+        "elapsed_s": elapsed,
+        "throughput_rps": total / elapsed,
+        **percentiles(samples),
+    }
+
+
+async def run_load(args, user_ids, port: int, proc: subprocess.Popen) -> dict:
+    rng = np.random.default_rng(args.seed)
+
+    # Each run draws its own users, so later levels are not served from the
+    # response cache warmed by earlier ones
+    def recommendations(total):
+        users = [user_ids[i] for i in rng.integers(0, len(user_ids), total)]
+        return lambda i: ("/recommendations", {
+            "user_id": users[i], "n": args.n, "candidate_cap": args.candidate_cap, "min_pop": args.min_pop,
+        })
+
+    def popular(total):
+        return lambda i: ("/popular", {"n": args.n, "min_pop": args.min_pop})
+
+    endpoints = {"/recommendations": recommendations, "/popular": popular}
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0) as client:
+        await wait_ready(client, proc)
+        results = []
+        for endpoint in args.endpoints:
+            requests = endpoints[endpoint]
+            await drive(client, requests(args.warmup), min(args.concurrency), args.warmup)
+            for concurrency in args.concurrency:
+                result = await drive(client, requests(args.requests), concurrency, args.requests)
+                results.append({"endpoint": endpoint, **result})
+                print(f"{endpoint} c={concurrency}: {result['throughput_rps']:.0f} req/s, "
+                      f"p50 {result['p50_ms']:.1f}ms p99 {result['p99_ms']:.1f}ms, "
+                      f"{result['errors']} errors", file=sys.stderr)
+        # stats of whichever worker answers
+        server = {
+            "cache": (await client.get("/cache/stats")).json(),
+            "batcher": (await client.get("/batcher/stats")).json(),
+        }
+    return {"results": results, "server": server}
+
+
+def compare(report: dict, baseline: dict) -> list:
+    """Per (endpoint, concurrency): current / baseline ratios of throughput and latency percentiles"""
+    base = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    rows = []
+    for r in report["results"]:
+        b = base.get((r["endpoint"], r["concurrency"]))
+        if b is None:
+            continue
+        rows.append({
+            "endpoint": r["endpoint"],
+            "concurrency": r["concurrency"],
+            **{f"{k}_ratio": r[k] / b[k] if b[k] else None
+               for k in ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]},
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--interactions", type=int, default=100_000, help="10k to 10M")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--database-url", default=None, help="default: SQLite file in the work directory")
+    parser.add_argument("--reset-db", action="store_true", help="allow seeding a non-SQLite database")
+    parser.add_argument("--workdir", default=None, help="keep the model and SQLite file here (default: temporary)")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the database and model in --workdir")
+    parser.add_argument("--endpoints", nargs="+", default=["/recommendations", "/popular"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=2_000, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="disable response caching in the server")
+    parser.add_argument("--n", type=int, default=20)
+    parser.add_argument("--candidate-cap", type=int, default=20_000)
+    parser.add_argument("--min-pop", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="also write the report here")
+    parser.add_argument("--compare", default=None, help="earlier report to compute ratios against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        model_dir = os.path.join(workdir, "model")
+        database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+        if args.skip_seed and not args.workdir:
+            parser.error("--skip-seed needs the --workdir of an earlier run")
+        if not database_url.startswith("sqlite") and not (args.reset_db or args.skip_seed):
+            parser.error("seeding drops and recreates tables; pass --reset-db for a scratch database")
+
+        seed_s = None
+        if not args.skip_seed:
+            start = time.perf_counter()
+            interactions = make_interactions(args.users, args.books, args.interactions, args.seed)
+            artifacts = make_artifacts(args.users, args.books, args.interactions, args.dim, args.seed, interactions)
+            save_artifacts(artifacts, model_dir)
+            asyncio.run(seed_database(database_url, interactions, artifacts.book_metadata))
+            seed_s = time.perf_counter() - start
+            del interactions, artifacts
+
+        port = free_port()
+        proc = start_server(args, model_dir, database_url, port)
+        try:
+            load = asyncio.run(run_load(args, [str(i) for i in range(args.users)], port, proc))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    report = {
+        "benchmark": "api_load",
+        **git_commit(),
+        "config": {**vars(args), "database": database_url.split(":", 1)[0]},
+        "seed_s": seed_s,
+        **load,
+    }
+    report["config"].pop("database_url")
+    if args.compare:
+        with open(args.compare) as f:
+            report["compare"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+from modeling.artifacts import ModelArtifacts, build_user_items, count_ratings, rating_fingerprints
+
+
+def make_interactions(num_users: int, num_books: int, num_interactions: int, seed: int = 42) -> pl.DataFrame:
+    """
+    Synthetic interactions with a Zipf-like book popularity, deduplicated on
+    (user_id, book_id) like the real table.
+    """
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, num_users, num_interactions)
+    # Zipf-ish popularity so popularity floors behave like real data
+    weights = 1.0 / np.arange(1, num_books + 1) ** 0.8
+    books = rng.choice(num_books, size=num_interactions, p=weights / weights.sum())
+    ratings = rng.integers(1, 6, num_interactions)
+
+    return pl.DataFrame({
+        "user_id": users.astype(str),
+        "book_id": books.astype(str),
+        "rating": ratings,
+    }).unique(subset=["user_id", "book_id"], keep="first")
+
+
+def make_artifacts(
+    num_users: int = 10_000,
+    num_books: int = 50_000,
+    num_interactions: int = 500_000,
+    dim: int = 64,
+    seed: int = 42,
+    interactions: Optional[pl.DataFrame] = None,
+) -> ModelArtifacts:
+    """
+    Random L2-normalized embeddings plus synthetic interactions, shaped like an
+    export. Pass interactions to reuse ones already generated (e.g. also
+    loaded into a database).
+    """
+    rng = np.random.default_rng(seed)
+    if interactions is None:
+        interactions = make_interactions(num_users, num_books, num_interactions, seed)
+
+    user_ids = [str(i) for i in range(num_users)]
+    book_ids = [str(i) for i in range(num_books)]
+
+    def normalized(rows):
+        x = rng.standard_normal((rows, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    indptr, indices = build_user_items(interactions, user_ids, book_ids)
+    return ModelArtifacts(
+        book_ids=book_ids,
+        book_embeddings=normalized(num_books),
+        n_ratings=count_ratings(interactions, book_ids),
+        book_metadata=pl.DataFrame({
+            "book_id": book_ids,
+            "title": [f"Book {b}" for b in book_ids],
+            "image_url": [None] * num_books,
+            "average_rating": rng.uniform(1, 5, num_books).round(2),
+        }),
+        user_ids=user_ids,
+        user_embeddings=normalized(num_users),
+        user_items_indptr=indptr,
+        user_items_indices=indices,
+        user_fingerprints=rating_fingerprints(interactions, user_ids, book_ids),
+    )
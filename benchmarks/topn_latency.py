@@ -0,0 +1,69 @@
+"""
+Latency benchmark for modeling.recommend.Recommender.topn on synthetic artifacts.
+
+    python -m benchmarks.topn_latency --users 10000 --books 50000 --calls 2000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_artifacts
+from modeling.recommend import Recommender
+
+
+def percentiles(samples_ms):
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+    }
+
+
+def run(args):
+    start = time.perf_counter()
+    artifacts = make_artifacts(args.users, args.books, args.interactions, args.dim, args.seed)
+    recommender = Recommender(artifacts)
+    setup_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    user_ids = [artifacts.user_ids[i] for i in rng.integers(0, args.users, args.calls)]
+
+    # Warm up BLAS / caches
+    for user_id in user_ids[:50]:
+        recommender.topn(user_id, n=args.n, candidate_cap=args.candidate_cap, min_pop=args.min_pop)
+
+    samples = []
+    for user_id in user_ids:
+        t0 = time.perf_counter()
+        recommender.topn(user_id, n=args.n, candidate_cap=args.candidate_cap, min_pop=args.min_pop)
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "benchmark": "topn_latency",
+        "config": vars(args),
+        "setup_s": setup_s,
+        "candidates": recommender.num_candidates(args.candidate_cap, args.min_pop),
+        **percentiles(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--interactions", type=int, default=500_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--calls", type=int, default=2_000)
+    parser.add_argument("--n", type=int, default=20)
+    parser.add_argument("--candidate-cap", type=int, default=20_000)
+    parser.add_argument("--min-pop", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+-- aggregates.sql
+-- Per-book / per-user interaction counters maintained incrementally from
+-- interactions. They replace full GROUP BY refreshes of the materialized
+-- views in views.sql: each statement against interactions (one scraper
+-- upsert batch) adjusts only the counters of the rows it touched.
+-- Drift is corrected by the scheduled reconcile job (python -m database.reconcile).
+
+CREATE TABLE IF NOT EXISTS book_interaction_counts (
+  book_id TEXT PRIMARY KEY,
+  n_ratings BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_book_interaction_counts_n
+  ON book_interaction_counts (n_ratings DESC);
+
+CREATE TABLE IF NOT EXISTS user_interaction_counts (
+  user_id TEXT PRIMARY KEY,
+  n_interactions BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_user_interaction_counts_n
+  ON user_interaction_counts (n_interactions DESC);
+
+
+-- Statement-level triggers: the transition tables hold every row of the
+-- batch, so counters are bumped once per (book|user) per statement.
+-- Counter rows are always locked in key order (here and in
+-- database.reconcile), so concurrent batches queue instead of deadlocking.
+-- Functions pin the search_path they were created with, so this file can
+-- also be applied to the compact schema (see schema_compact.sql).
+
+CREATE OR REPLACE FUNCTION interaction_counts_insert() RETURNS trigger
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+  INSERT INTO book_interaction_counts AS c (book_id, n_ratings)
+  SELECT book_id, COUNT(*) FROM new_rows GROUP BY book_id ORDER BY book_id
+  ON CONFLICT (book_id) DO UPDATE SET n_ratings = c.n_ratings + EXCLUDED.n_ratings;
+
+  INSERT INTO user_interaction_counts AS c (user_id, n_interactions)
+  SELECT user_id, COUNT(*) FROM new_rows GROUP BY user_id ORDER BY user_id
+  ON CONFLICT (user_id) DO UPDATE SET n_interactions = c.n_interactions + EXCLUDED.n_interactions;
+  RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION interaction_counts_delete() RETURNS trigger
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+  PERFORM 1 FROM book_interaction_counts
+  WHERE book_id IN (SELECT book_id FROM old_rows) ORDER BY book_id FOR UPDATE;
+  UPDATE book_interaction_counts c SET n_ratings = c.n_ratings - d.n
+  FROM (SELECT book_id, COUNT(*) AS n FROM old_rows GROUP BY book_id) d
+  WHERE c.book_id = d.book_id;
+
+  PERFORM 1 FROM user_interaction_counts
+  WHERE user_id IN (SELECT user_id FROM old_rows) ORDER BY user_id FOR UPDATE;
+  UPDATE user_interaction_counts c SET n_interactions = c.n_interactions - d.n
+  FROM (SELECT user_id, COUNT(*) AS n FROM old_rows GROUP BY user_id) d
+  WHERE c.user_id = d.user_id;
+  RETURN NULL;
+END $$;
+
+-- Upserts that only change rating/date_read net to zero and write nothing
+CREATE OR REPLACE FUNCTION interaction_counts_update() RETURNS trigger
+LANGUAGE plpgsql SET search_path FROM CURRENT AS $$
+BEGIN
+  INSERT INTO book_interaction_counts AS c (book_id, n_ratings)
+  SELECT book_id, SUM(d) FROM (
+    SELECT book_id, 1 AS d FROM new_rows
+    UNION ALL
+    SELECT book_id, -1 FROM old_rows
+  ) x GROUP BY book_id HAVING SUM(d) <> 0 ORDER BY book_id
+  ON CONFLICT (book_id) DO UPDATE SET n_ratings = c.n_ratings + EXCLUDED.n_ratings;
+
+  INSERT INTO user_interaction_counts AS c (user_id, n_interactions)
+  SELECT user_id, SUM(d) FROM (
+    SELECT user_id, 1 AS d FROM new_rows
+    UNION ALL
+    SELECT user_id, -1 FROM old_rows
+  ) x GROUP BY user_id HAVING SUM(d) <> 0 ORDER BY user_id
+  ON CONFLICT (user_id) DO UPDATE SET n_interactions = c.n_interactions + EXCLUDED.n_interactions;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_interaction_counts_insert ON interactions;
+CREATE TRIGGER trg_interaction_counts_insert
+  AFTER INSERT ON interactions
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION interaction_counts_insert();
+
+DROP TRIGGER IF EXISTS trg_interaction_counts_delete ON interactions;
+CREATE TRIGGER trg_interaction_counts_delete
+  AFTER DELETE ON interactions
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION interaction_counts_delete();
+
+DROP TRIGGER IF EXISTS trg_interaction_counts_update ON interactions;
+CREATE TRIGGER trg_interaction_counts_update
+  AFTER UPDATE ON interactions
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION interaction_counts_update();
+
+
+-- One-time backfill (afterwards the triggers keep the counters current):
+-- python -m database.reconcile
@@ -0,0 +1,59 @@
+"""
+Cache invalidation signals, shared by the API and the jobs that change its
+data (scrapers, database.reconcile) without importing either side.
+
+Writers publish a tag on a Redis channel after they commit. Every API
+process subscribes (api.cache.ResponseCache.listen) and drops the matching
+entries from its local tier, the shared tier and derived in-process state
+such as fold-in embeddings. This needs CACHE_URL in both processes; without
+it there is no cross-process channel and API caches only pick up changes
+as their entries expire.
+"""
+import logging
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "grrec:invalidate"
+
+# Invalidation tags
+POPULAR_TAG = "popular"
+USER_TAG_PREFIX = "user:"
+
+
+def user_tag(user_id: str) -> str:
+    return f"{USER_TAG_PREFIX}{user_id}"
+
+
+@lru_cache(maxsize=1)
+def _client():
+    url = os.getenv("CACHE_URL")
+    if not url:
+        logger.warning("CACHE_URL not set: API caches will only see changes after their TTL")
+        return None
+    import redis
+
+    return redis.Redis.from_url(url)
+
+
+def publish(tag: str) -> int:
+    """Broadcast tag to every subscribed API process; returns the number of receivers"""
+    client = _client()
+    if client is None:
+        return 0
+    try:
+        return client.publish(INVALIDATION_CHANNEL, tag)
+    except Exception as e:
+        logger.warning(f"Failed to publish invalidation for {tag}: {e}")
+        return 0
+
+
+def invalidate_popular() -> int:
+    """Call after the popularity counters are reconciled"""
+    return publish(POPULAR_TAG)
+
+
+def invalidate_user(user_id: str) -> int:
+    """Call after a user's interactions are upserted"""
+    return publish(user_tag(user_id))
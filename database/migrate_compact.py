@@ -0,0 +1,170 @@
+"""
+Online conversion of the TEXT-keyed tables (schema.sql) into the compact
+schema (schema_compact.sql). Apply schema_compact.sql first: its triggers
+forward concurrent writes while this copies existing rows.
+
+    python -m database.migrate_compact backfill [--batch-size 10000]
+    python -m database.migrate_compact verify
+
+Each batch is its own short transaction that share-locks only the rows it
+copies, so writers are never blocked for long and the job can be stopped
+and re-run at any point (rows already identical are not rewritten). verify
+compares every column, so rows the triggers created before the backfill
+reached them are checked too.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from database.pool import create_pool
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+USER_COLS = ["join_date", "num_books_read", "avg_rating_given", "location"]
+BOOK_COLS = [
+    "title", "description", "author_id", "author_name", "average_rating",
+    "ratings_count", "publication_year", "genres", "top_shelves", "num_pages",
+    "cover_image_url", "isbn", "created_at", "updated_at",
+]
+# FLOAT in schema.sql, REAL in schema_compact.sql
+REAL_COLS = {"avg_rating_given", "average_rating"}
+
+
+def _backfill_sql(table: str, key: str, cursor: str, cols):
+    """
+    Copy one keyset batch. Rows the forwarding triggers already wrote are
+    overwritten only where they differ (e.g. a row created from an earlier
+    snapshot), so re-runs write nothing.
+    """
+    col_list = ", ".join(cols)
+    return text(f"""
+        WITH batch AS (
+            SELECT * FROM public.{table}
+            WHERE {key} > :{cursor}
+            ORDER BY {key}
+            LIMIT :batch_size
+            FOR SHARE
+        ), ins AS (
+            INSERT INTO compact.{table} AS c (external_id, {col_list})
+            SELECT {key}, {col_list} FROM batch
+            ON CONFLICT (external_id) DO UPDATE SET
+                {", ".join(f"{col} = EXCLUDED.{col}" for col in cols)}
+            WHERE ({", ".join(f"c.{col}" for col in cols)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{col}" for col in cols)})
+        )
+        SELECT (SELECT COUNT(*) FROM batch) AS n, (SELECT MAX({key}) FROM batch) AS {cursor}
+    """)
+
+
+BACKFILL_USERS_SQL = _backfill_sql("users", "user_id", "last_user", USER_COLS)
+BACKFILL_BOOKS_SQL = _backfill_sql("books", "book_id", "last_book", BOOK_COLS)
+
+# Keyset pagination over the (user_id, book_id) primary key
+BACKFILL_INTERACTIONS_SQL = text("""
+    WITH batch AS (
+        SELECT user_id, book_id, user_rating, date_read FROM public.interactions
+        WHERE (user_id, book_id) > (:last_user, :last_book)
+        ORDER BY user_id, book_id
+        LIMIT :batch_size
+        FOR SHARE
+    ), ins AS (
+        INSERT INTO compact.interactions (user_id, book_id, date_read, user_rating)
+        SELECT u.user_id, b.book_id, batch.date_read, batch.user_rating
+        FROM batch
+        JOIN compact.users u ON u.external_id = batch.user_id
+        JOIN compact.books b ON b.external_id = batch.book_id
+        ON CONFLICT (user_id, book_id) DO NOTHING
+    ), last AS (
+        SELECT user_id, book_id FROM batch ORDER BY user_id DESC, book_id DESC LIMIT 1
+    )
+    SELECT (SELECT COUNT(*) FROM batch) AS n, last.user_id AS last_user, last.book_id AS last_book
+    FROM (SELECT 1) one LEFT JOIN last ON TRUE
+""")
+
+# Compact rows in the TEXT tables' shape, for comparing contents
+COMPACT_AS_TEXT = {
+    "users": ("user_id", f"SELECT external_id AS user_id, {', '.join(USER_COLS)} FROM compact.users"),
+    "books": ("book_id", f"SELECT external_id AS book_id, {', '.join(BOOK_COLS)} FROM compact.books"),
+    "interactions": ("user_id, book_id", """
+        SELECT u.external_id AS user_id, b.external_id AS book_id, i.date_read, i.user_rating
+        FROM compact.interactions i
+        JOIN compact.users u ON u.user_id = i.user_id
+        JOIN compact.books b ON b.book_id = i.book_id
+    """),
+}
+VERIFY_COLS = {"users": USER_COLS, "books": BOOK_COLS, "interactions": ["date_read", "user_rating"]}
+
+
+def _verify_sql(table: str):
+    """Rows missing from compact, rows only in compact, and rows whose columns differ"""
+    keys, compact_rows = COMPACT_AS_TEXT[table]
+    first_key = keys.split(",")[0]
+    cols = VERIFY_COLS[table]
+    source = ", ".join(f"p.{c}::real" if c in REAL_COLS else f"p.{c}" for c in cols)
+    target = ", ".join(f"c.{c}" for c in cols)
+    return text(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE c.{first_key} IS NULL) AS missing,
+            COUNT(*) FILTER (WHERE p.{first_key} IS NULL) AS extra,
+            COUNT(*) FILTER (WHERE p.{first_key} IS NOT NULL AND c.{first_key} IS NOT NULL
+                             AND ({source}) IS DISTINCT FROM ({target})) AS different
+        FROM public.{table} p
+        FULL JOIN ({compact_rows}) c USING ({keys})
+    """)
+
+async def _run_batches(engine, name: str, stmt, cursor: dict, batch_size: int):
+    copied, start = 0, time.perf_counter()
+    while True:
+        async with engine.begin() as conn:
+            row = (await conn.execute(stmt, {**cursor, "batch_size": batch_size})).mappings().one()
+        if not row["n"]:
+            break
+        copied += row["n"]
+        cursor = {k: row[k] for k in cursor}
+        logger.info(f"{name}: {copied} rows scanned ({copied / (time.perf_counter() - start):.0f}/s)")
+    logger.info(f"{name}: done, {copied} rows scanned")
+
+
+async def backfill(engine, batch_size: int):
+    # users and books first so every interaction can resolve its surrogate ids
+    await _run_batches(engine, "users", BACKFILL_USERS_SQL, {"last_user": ""}, batch_size)
+    await _run_batches(engine, "books", BACKFILL_BOOKS_SQL, {"last_book": ""}, batch_size)
+    await _run_batches(engine, "interactions", BACKFILL_INTERACTIONS_SQL,
+                       {"last_user": "", "last_book": ""}, batch_size)
+
+
+async def verify(engine) -> bool:
+    """Compare contents, not just counts: stub or stale rows count as differences"""
+    ok = True
+    async with engine.connect() as conn:
+        for table in COMPACT_AS_TEXT:
+            row = (await conn.execute(_verify_sql(table))).mappings().one()
+            good = not any(row.values())
+            ok &= good
+            logger.info(f"{table}: missing={row['missing']} extra={row['extra']} "
+                        f"different={row['different']} {'ok' if good else 'MISMATCH'}")
+    return ok
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert TEXT-keyed tables to the compact schema")
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = create_pool()
+    try:
+        if args.command == "backfill":
+            await backfill(engine, args.batch_size)
+            await verify(engine)
+        elif not await verify(engine):
+            raise SystemExit(1)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
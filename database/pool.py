@@ -0,0 +1,175 @@
+import os
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import TextClause, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+# Tables the serving and extract queries read: "public" (schema.sql, TEXT
+# Goodreads ids) or "compact" (schema_compact.sql, BIGINT surrogate keys).
+# Compact queries map the surrogates back through users/books.external_id,
+# so callers get Goodreads ids either way.
+DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
+
+# Popular books with metadata in a single round trip, most popular first.
+# Reads the trigger-maintained counters (aggregates.sql) via their n_ratings index.
+POPULAR_ITEMS_SQL = text("""
+    SELECT p.book_id, m.title, m.image_url, p.n_ratings
+    FROM book_interaction_counts p
+    JOIN book_metadata m ON m.book_id = p.book_id
+    WHERE p.n_ratings >= :min_pop
+    ORDER BY p.n_ratings DESC
+    LIMIT :n
+""")
+
+# One user's interactions for fold-in; a range scan on the (user_id, book_id) primary key
+USER_HISTORY_SQL = text("""
+    SELECT book_id, user_rating
+    FROM interactions
+    WHERE user_id = :user_id
+""")
+
+# Same for many users in one round trip (bulk recommendations)
+USERS_HISTORY_SQL = text("""
+    SELECT user_id, book_id, user_rating
+    FROM interactions
+    WHERE user_id IN :user_ids
+""").bindparams(bindparam("user_ids", expanding=True))
+
+# Training extract: interactions read in [since, until) (see database.extract)
+EXTRACT_SQL = text("""
+    SELECT user_id, book_id, user_rating AS rating, date_read
+    FROM interactions
+    WHERE date_read >= :since AND date_read < :until
+""")
+
+# Compact schema: metadata comes from compact.books
+COMPACT_POPULAR_ITEMS_SQL = text("""
+    SELECT b.external_id AS book_id, b.title, b.cover_image_url AS image_url, p.n_ratings
+    FROM compact.book_interaction_counts p
+    JOIN compact.books b ON b.book_id = p.book_id
+    WHERE p.n_ratings >= :min_pop
+    ORDER BY p.n_ratings DESC
+    LIMIT :n
+""")
+
+# external_id -> surrogate, then one partition of interactions by its primary key
+COMPACT_USER_HISTORY_SQL = text("""
+    SELECT b.external_id AS book_id, i.user_rating
+    FROM compact.users u
+    JOIN compact.interactions i ON i.user_id = u.user_id
+    JOIN compact.books b ON b.book_id = i.book_id
+    WHERE u.external_id = :user_id
+""")
+
+COMPACT_USERS_HISTORY_SQL = text("""
+    SELECT u.external_id AS user_id, b.external_id AS book_id, i.user_rating
+    FROM compact.users u
+    JOIN compact.interactions i ON i.user_id = u.user_id
+    JOIN compact.books b ON b.book_id = i.book_id
+    WHERE u.external_id IN :user_ids
+""").bindparams(bindparam("user_ids", expanding=True))
+
+# Range scan on idx_interactions_date_read
+COMPACT_EXTRACT_SQL = text("""
+    SELECT u.external_id AS user_id, b.external_id AS book_id, i.user_rating AS rating, i.date_read
+    FROM compact.interactions i
+    JOIN compact.users u ON u.user_id = i.user_id
+    JOIN compact.books b ON b.book_id = i.book_id
+    WHERE i.date_read >= :since AND i.date_read < :until
+""")
+
+QUERIES = {
+    "public": {
+        "popular": POPULAR_ITEMS_SQL,
+        "user_history": USER_HISTORY_SQL,
+        "users_history": USERS_HISTORY_SQL,
+        "extract": EXTRACT_SQL,
+    },
+    "compact": {
+        "popular": COMPACT_POPULAR_ITEMS_SQL,
+        "user_history": COMPACT_USER_HISTORY_SQL,
+        "users_history": COMPACT_USERS_HISTORY_SQL,
+        "extract": COMPACT_EXTRACT_SQL,
+    },
+}
+
+
+def query(name: str, schema: Optional[str] = None) -> TextClause:
+    """The statement called name for schema (default DB_SCHEMA)"""
+    schema = schema or DB_SCHEMA
+    if schema not in QUERIES:
+        raise ValueError(f"DB_SCHEMA must be one of {sorted(QUERIES)}, got {schema!r}")
+    return QUERIES[schema][name]
+
+
+def database_url(driver: str = "asyncpg") -> str:
+    """DATABASE_URL if set, otherwise a Postgres URL built from the PG* env vars"""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    return (
+        f"postgresql+{driver}://{os.getenv('PGUSER','postgres')}:"
+        f"{os.getenv('PGPASSWORD','ZippyKiko88')}"
+        f"@{os.getenv('PGHOST','localhost')}:{os.getenv('PGPORT','5432')}/"
+        f"{os.getenv('PGDATABASE','goodreads')}"
+    )
+
+
+def create_pool(url: Optional[str] = None) -> AsyncEngine:
+    """
+    Create the application-wide async engine (one connection pool per process).
+
+    With asyncpg, statements are prepared server-side once per connection and
+    reused from the statement cache on every subsequent call.
+    """
+    url = url or database_url()
+    kwargs = {"pool_pre_ping": True}
+
+    if url.startswith("postgresql"):
+        kwargs.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+            pool_recycle=1800,
+        )
+    if url.startswith("postgresql+asyncpg"):
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256")),
+        }
+
+    engine = create_async_engine(url, **kwargs)
+    logger.info(f"Created DB pool for {engine.url.render_as_string(hide_password=True)}")
+    return engine
+
+
+async def fetch_popular(engine: AsyncEngine, n: int, min_pop: int, schema: Optional[str] = None) -> List[Dict]:
+    """Rows from POPULAR_ITEMS_SQL (or its compact variant) as plain dicts"""
+    async with engine.connect() as conn:
+        result = await conn.execute(query("popular", schema), {"min_pop": min_pop, "n": n})
+        return [dict(row) for row in result.mappings()]
+
+
+async def fetch_user_history(
+    engine: AsyncEngine, user_id: str, schema: Optional[str] = None
+) -> List[Tuple[str, Optional[int]]]:
+    """(book_id, user_rating) pairs for one user"""
+    async with engine.connect() as conn:
+        result = await conn.execute(query("user_history", schema), {"user_id": user_id})
+        return [tuple(row) for row in result]
+
+
+async def fetch_users_history(
+    engine: AsyncEngine, user_ids: Sequence[str], schema: Optional[str] = None
+) -> Dict[str, List[Tuple[str, Optional[int]]]]:
+    """(book_id, user_rating) pairs per user; users without interactions map to []"""
+    history = {user_id: [] for user_id in user_ids}
+    if not history:
+        return history
+    async with engine.connect() as conn:
+        result = await conn.execute(query("users_history", schema), {"user_ids": list(history)})
+        for user_id, book_id, rating in result:
+            history[user_id].append((book_id, rating))
+    return history
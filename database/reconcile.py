@@ -0,0 +1,144 @@
+"""
+Recompute the interaction counters from database/aggregates.sql and fix any
+drift, then invalidate the API responses that depend on them. Also serves as
+the initial backfill. Run on a schedule (e.g. nightly):
+
+    python -m database.reconcile [--batch-size 10000]
+
+Keys are walked in keyset batches of about batch_size interactions. Each
+batch is one short transaction that row-locks its counters (FOR UPDATE)
+before recounting them. The triggers update the same rows, so a concurrent
+upsert either lands before the recount (and is counted) or waits and applies
+its delta on top; writers to other keys are never blocked.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from database.invalidation import invalidate_popular
+from database.pool import create_pool
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# (counter table, key column, count column); both keys are indexed on interactions (see ensure_book_index)
+COUNTERS = [
+    ("book_interaction_counts", "book_id", "n_ratings"),
+    ("user_interaction_counts", "user_id", "n_interactions"),
+]
+
+
+def key_range(col: str, lower: bool, upper: bool) -> str:
+    """col in (:last, :hi]; either bound can be open (first / final batch)"""
+    conds = ([f"{col} > :last"] if lower else []) + ([f"{col} <= :hi"] if upper else [])
+    return " AND ".join(conds) or "TRUE"
+
+
+def batch_statements(table: str, key: str, count: str, lower: bool, upper: bool):
+    """Statements run in order, in one transaction, for the keys of one batch"""
+    in_range = key_range(key, lower, upper)
+    return [
+        # counters missing entirely get a placeholder row, so they can be locked
+        text(f"""
+            INSERT INTO {table} ({key}, {count})
+            SELECT DISTINCT {key}, 0 FROM interactions WHERE {in_range}
+            ON CONFLICT ({key}) DO NOTHING
+        """),
+        text(f"SELECT {key} FROM {table} WHERE {in_range} ORDER BY {key} FOR UPDATE"),
+        # a new statement, so it sees every write committed while we waited for the locks
+        text(f"""
+            UPDATE {table} c SET {count} = t.n
+            FROM (
+                SELECT k.{key}, COUNT(i.{key}) AS n
+                FROM {table} k LEFT JOIN interactions i ON i.{key} = k.{key}
+                WHERE {key_range(f"k.{key}", lower, upper)}
+                GROUP BY k.{key}
+            ) t
+            WHERE c.{key} = t.{key} AND c.{count} IS DISTINCT FROM t.n
+        """),
+        text(f"DELETE FROM {table} WHERE {in_range} AND {count} = 0"),
+    ]
+
+
+async def reconcile_batch(engine, table: str, key: str, count: str, last, batch_size: int):
+    """Reconcile the keys after last; returns (upper bound or None if this was the final batch, rows fixed)"""
+    lower = last is not None
+    async with engine.begin() as conn:
+        # upper bound: the key batch_size interactions further along its index
+        hi = (await conn.execute(text(f"""
+            SELECT {key} FROM interactions WHERE {key_range(key, lower, False)}
+            ORDER BY {key} OFFSET :batch_size LIMIT 1
+        """), {"last": last, "batch_size": batch_size})).scalar()
+
+        add_missing, lock, recount, drop_empty = batch_statements(table, key, count, lower, hi is not None)
+        params = {"last": last, "hi": hi}
+        await conn.execute(add_missing, params)
+        await conn.execute(lock, params)
+        # placeholders from add_missing show up here as corrections
+        fixed = (await conn.execute(recount, params)).rowcount
+        fixed += (await conn.execute(drop_empty, params)).rowcount
+    return hi, fixed
+
+
+async def reconcile_counter(engine, table: str, key: str, count: str, batch_size: int, retries: int = 3):
+    fixed, batches, start = 0, 0, time.perf_counter()
+    last = None
+    while True:
+        for attempt in range(retries + 1):
+            try:
+                hi, n = await reconcile_batch(engine, table, key, count, last, batch_size)
+                break
+            except DBAPIError as e:
+                # batches and triggers both lock counters in key order, but a writer
+                # transaction with several statements can still close a cycle; rare,
+                # so retry the batch rather than fail the run
+                if "deadlock" not in str(e) or attempt == retries:
+                    raise
+                logger.warning(f"{table}: deadlock after {last!r}, retrying batch")
+        fixed += n
+        batches += 1
+        if hi is None:
+            break
+        last = hi
+    logger.info(f"Reconciled {table}: {fixed} rows corrected in {batches} batches "
+                f"({time.perf_counter() - start:.1f}s)")
+
+
+async def ensure_book_index(engine):
+    """
+    Batches walk interactions by book_id, which the TEXT schema does not index
+    (users use the primary key; schema_compact.sql has its own). Built
+    CONCURRENTLY so writers are not blocked while it builds.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if (await conn.execute(text("SELECT to_regclass('idx_interactions_book')"))).scalar() is None:
+            logger.info("Creating idx_interactions_book")
+            await conn.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_interactions_book ON interactions (book_id)"))
+
+
+async def reconcile_counts(engine, batch_size: int = 10_000):
+    await ensure_book_index(engine)
+    for table, key, count in COUNTERS:
+        await reconcile_counter(engine, table, key, count, batch_size)
+    invalidate_popular()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recount the interaction counters and fix drift")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    engine = create_pool()
+    try:
+        await reconcile_counts(engine, args.batch_size)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,217 @@
+-- schema_compact.sql
+-- Compact schema mode: the same data as schema.sql under the "compact" schema,
+-- keyed on BIGINT surrogate ids (the Goodreads TEXT id is kept once, in
+-- users/books.external_id), with interactions hash-partitioned by user and
+-- indexed for per-book and by-date access. interactions.shelves is dropped.
+--
+-- Setup, then online conversion of the existing TEXT tables:
+--   psql -f database/schema_compact.sql
+--   PGOPTIONS='-c search_path=compact,public' psql -f database/aggregates.sql
+--   PGOPTIONS='-c search_path=compact,public' psql -f database/views.sql
+--   python -m database.migrate_compact backfill
+--   python -m database.migrate_compact verify
+-- The forwarding triggers at the bottom keep compact in sync with writes to
+-- the TEXT tables while (and after) the backfill runs.
+-- Readers: the API with DB_SCHEMA=compact, and database.extract.
+
+CREATE SCHEMA IF NOT EXISTS compact;
+
+CREATE TABLE IF NOT EXISTS compact.users (
+  user_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  external_id TEXT NOT NULL UNIQUE,
+  join_date DATE,
+  num_books_read INT,
+  avg_rating_given REAL,
+  location TEXT
+);
+
+CREATE TABLE IF NOT EXISTS compact.books (
+    book_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    external_id TEXT NOT NULL UNIQUE,
+
+    title TEXT,
+    description TEXT,
+
+    author_id TEXT,
+    author_name TEXT,
+
+    average_rating REAL,
+    ratings_count INTEGER,
+    publication_year SMALLINT,
+
+    genres TEXT[],
+    top_shelves TEXT[],
+
+    num_pages INTEGER,
+    cover_image_url TEXT,
+
+    isbn TEXT,
+
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Fixed-width columns first: 8 + 8 + 4 + 2 bytes per row, no TEXT keys
+CREATE TABLE IF NOT EXISTS compact.interactions (
+  user_id BIGINT NOT NULL REFERENCES compact.users(user_id),
+  book_id BIGINT NOT NULL REFERENCES compact.books(book_id),
+  date_read DATE,
+  user_rating SMALLINT,
+  PRIMARY KEY (user_id, book_id)
+) PARTITION BY HASH (user_id);
+
+DO $$
+BEGIN
+  FOR i IN 0..15 LOOP
+    EXECUTE format(
+      'CREATE TABLE IF NOT EXISTS compact.interactions_p%s PARTITION OF compact.interactions
+         FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+  END LOOP;
+END $$;
+
+-- Per-book lookups, popularity recounts and reviewer-graph joins
+CREATE INDEX IF NOT EXISTS idx_interactions_book
+  ON compact.interactions (book_id) INCLUDE (user_rating);
+-- Time-bounded training extracts
+CREATE INDEX IF NOT EXISTS idx_interactions_date_read
+  ON compact.interactions (date_read);
+
+-- BIGINT-keyed counters; aggregates.sql (run with search_path=compact)
+-- finds these already present and only adds its triggers
+CREATE TABLE IF NOT EXISTS compact.book_interaction_counts (
+  book_id BIGINT PRIMARY KEY,
+  n_ratings BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_book_interaction_counts_n
+  ON compact.book_interaction_counts (n_ratings DESC);
+
+CREATE TABLE IF NOT EXISTS compact.user_interaction_counts (
+  user_id BIGINT PRIMARY KEY,
+  n_interactions BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_user_interaction_counts_n
+  ON compact.user_interaction_counts (n_interactions DESC);
+
+
+-- Online migration: forward every write on the TEXT tables into compact.
+-- Installed before the backfill, so rows written during it are not missed;
+-- the backfill overwrites users/books rows only where they differ.
+
+CREATE OR REPLACE FUNCTION compact.forward_users() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    DELETE FROM compact.users WHERE external_id = OLD.user_id;
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO compact.users (external_id, join_date, num_books_read, avg_rating_given, location)
+  VALUES (NEW.user_id, NEW.join_date, NEW.num_books_read, NEW.avg_rating_given, NEW.location)
+  ON CONFLICT (external_id) DO UPDATE SET
+    join_date = EXCLUDED.join_date,
+    num_books_read = EXCLUDED.num_books_read,
+    avg_rating_given = EXCLUDED.avg_rating_given,
+    location = EXCLUDED.location;
+  RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION compact.forward_books() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    DELETE FROM compact.books WHERE external_id = OLD.book_id;
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO compact.books (
+    external_id, title, description, author_id, author_name, average_rating,
+    ratings_count, publication_year, genres, top_shelves, num_pages,
+    cover_image_url, isbn, created_at, updated_at)
+  VALUES (
+    NEW.book_id, NEW.title, NEW.description, NEW.author_id, NEW.author_name, NEW.average_rating,
+    NEW.ratings_count, NEW.publication_year, NEW.genres, NEW.top_shelves, NEW.num_pages,
+    NEW.cover_image_url, NEW.isbn, NEW.created_at, NEW.updated_at)
+  ON CONFLICT (external_id) DO UPDATE SET
+    title = EXCLUDED.title,
+    description = EXCLUDED.description,
+    author_id = EXCLUDED.author_id,
+    author_name = EXCLUDED.author_name,
+    average_rating = EXCLUDED.average_rating,
+    ratings_count = EXCLUDED.ratings_count,
+    publication_year = EXCLUDED.publication_year,
+    genres = EXCLUDED.genres,
+    top_shelves = EXCLUDED.top_shelves,
+    num_pages = EXCLUDED.num_pages,
+    cover_image_url = EXCLUDED.cover_image_url,
+    isbn = EXCLUDED.isbn,
+    updated_at = EXCLUDED.updated_at;
+  RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION compact.forward_interactions() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  uid BIGINT;
+  bid BIGINT;
+BEGIN
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE'
+      AND (OLD.user_id, OLD.book_id) IS DISTINCT FROM (NEW.user_id, NEW.book_id)) THEN
+    DELETE FROM compact.interactions i
+    USING compact.users u, compact.books b
+    WHERE u.external_id = OLD.user_id AND b.external_id = OLD.book_id
+      AND i.user_id = u.user_id AND i.book_id = b.book_id;
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    RETURN NULL;
+  END IF;
+
+  -- Users/books written before the triggers existed may not be backfilled
+  -- yet: copy their full row from the TEXT table (the foreign keys
+  -- guarantee it exists). Look up first, so existing ids cost no insert
+  -- and no identity value.
+  SELECT user_id INTO uid FROM compact.users WHERE external_id = NEW.user_id;
+  IF uid IS NULL THEN
+    INSERT INTO compact.users (external_id, join_date, num_books_read, avg_rating_given, location)
+    SELECT user_id, join_date, num_books_read, avg_rating_given, location
+    FROM public.users WHERE user_id = NEW.user_id
+    ON CONFLICT (external_id) DO NOTHING;
+    SELECT user_id INTO uid FROM compact.users WHERE external_id = NEW.user_id;
+  END IF;
+
+  SELECT book_id INTO bid FROM compact.books WHERE external_id = NEW.book_id;
+  IF bid IS NULL THEN
+    INSERT INTO compact.books (
+      external_id, title, description, author_id, author_name, average_rating,
+      ratings_count, publication_year, genres, top_shelves, num_pages,
+      cover_image_url, isbn, created_at, updated_at)
+    SELECT
+      book_id, title, description, author_id, author_name, average_rating,
+      ratings_count, publication_year, genres, top_shelves, num_pages,
+      cover_image_url, isbn, created_at, updated_at
+    FROM public.books WHERE book_id = NEW.book_id
+    ON CONFLICT (external_id) DO NOTHING;
+    SELECT book_id INTO bid FROM compact.books WHERE external_id = NEW.book_id;
+  END IF;
+
+  INSERT INTO compact.interactions (user_id, book_id, date_read, user_rating)
+  VALUES (uid, bid, NEW.date_read, NEW.user_rating)
+  ON CONFLICT (user_id, book_id) DO UPDATE SET
+    date_read = EXCLUDED.date_read,
+    user_rating = EXCLUDED.user_rating;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_forward_users ON public.users;
+CREATE TRIGGER trg_forward_users
+  AFTER INSERT OR UPDATE OR DELETE ON public.users
+  FOR EACH ROW EXECUTE FUNCTION compact.forward_users();
+
+DROP TRIGGER IF EXISTS trg_forward_books ON public.books;
+CREATE TRIGGER trg_forward_books
+  AFTER INSERT OR UPDATE OR DELETE ON public.books
+  FOR EACH ROW EXECUTE FUNCTION compact.forward_books();
+
+DROP TRIGGER IF EXISTS trg_forward_interactions ON public.interactions;
+CREATE TRIGGER trg_forward_interactions
+  AFTER INSERT OR UPDATE OR DELETE ON public.interactions
+  FOR EACH ROW EXECUTE FUNCTION compact.forward_interactions();
@@ -1,23 +1,32 @@
+-- Active users/items and popular candidates, answered from the incrementally
+-- maintained counters in aggregates.sql (run that first). These used to be
+-- materialized views refreshed with a full GROUP BY over interactions; as
+-- plain views over indexed counters they are always current.
+-- (drops only materialized views in the current schema, so the file can be re-run)
+DO $$
+DECLARE v TEXT;
+BEGIN
+  FOR v IN SELECT matviewname FROM pg_matviews
+           WHERE schemaname = current_schema()
+             AND matviewname IN ('mv_users_ge10', 'mv_books_ge30', 'mv_popular_items')
+  LOOP
+    EXECUTE format('DROP MATERIALIZED VIEW %I', v);
+  END LOOP;
+END $$;
+
 -- active users/items (you already used these)
-CREATE MATERIALIZED VIEW IF NOT EXISTS mv_users_ge10 AS
-SELECT user_id FROM interactions GROUP BY 1 HAVING COUNT(*) >= 10;
-CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_users_ge10 ON mv_users_ge10(user_id);
+CREATE OR REPLACE VIEW mv_users_ge10 AS
+SELECT user_id FROM user_interaction_counts WHERE n_interactions >= 10;
 
-CREATE MATERIALIZED VIEW IF NOT EXISTS mv_books_ge30 AS
-SELECT book_id FROM interactions GROUP BY 1 HAVING COUNT(*) >= 30;
-CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_books_ge30 ON mv_books_ge30(book_id);
+CREATE OR REPLACE VIEW mv_books_ge30 AS
+SELECT book_id FROM book_interaction_counts WHERE n_ratings >= 30;
 
 -- candidate items for scoring (popularity floor = 50; tweak)
-CREATE MATERIALIZED VIEW IF NOT EXISTS mv_popular_items AS
-SELECT book_id, COUNT(*) AS n_ratings
-FROM interactions
-GROUP BY book_id
-HAVING COUNT(*) >= 50
+CREATE OR REPLACE VIEW mv_popular_items AS
+SELECT book_id, n_ratings
+FROM book_interaction_counts
+WHERE n_ratings >= 50
 ORDER BY n_ratings DESC;
 
-CREATE INDEX IF NOT EXISTS idx_mv_popular_items ON mv_popular_items(book_id);
-
--- refresh these after big loads:
--- REFRESH MATERIALIZED VIEW CONCURRENTLY mv_users_ge10;
--- REFRESH MATERIALIZED VIEW CONCURRENTLY mv_books_ge30;
--- REFRESH MATERIALIZED VIEW CONCURRENTLY mv_popular_items;
+-- counters are kept current by triggers; correct any drift on a schedule:
+-- python -m database.reconcile
@@ -0,0 +1,232 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+
+from modeling.artifacts import METADATA_COLS, ModelArtifacts, rating_fingerprints
+
+logger = logging.getLogger(__name__)
+
+
+class ALS:
+    """
+    Alternating least squares matrix factorization on a CSR user x book matrix.
+
+    Each half-sweep solves every user (then every book) factor as a ridge
+    regression with the other side fixed. Rows are grouped into blocks and blocks run on
+    a thread pool; inside a block all work is NumPy/BLAS:
+
+    - rows are sorted by rating count, so a block holds rows of similar
+      length, and each row's ratings are zero-padded to the block's longest;
+    - all Gram matrices of a block come from one batched GEMM;
+    - each block ends in cg_steps of batched conjugate gradient warm-started
+      from the previous factors (Takacs et al.), or one batched
+      np.linalg.solve when cg_steps is 0.
+
+    Explicit mode fits centred ratings with ALS-WR regularization (lambda
+    scaled by each row's rating count), comparable with the surprise SVD
+    baseline. Implicit mode is Hu/Koren/Volinsky confidence weighting,
+    c = 1 + alpha * rating, with preference 1 for every observed pair.
+
+    Args:
+        factors: Embedding dimension
+        regularization: lambda
+        iterations: Full user + book sweeps
+        implicit: Use implicit-feedback ALS instead of explicit ratings
+        alpha: Confidence scale for implicit mode
+        cg_steps: Conjugate gradient steps per solve; 0 solves each system exactly
+        block_nnz: Ratings per block (bounds memory at about block_nnz * factors floats per thread)
+        workers: Threads solving blocks in parallel
+    """
+
+    def __init__(
+        self,
+        factors: int = 64,
+        regularization: float = 0.05,
+        iterations: int = 15,
+        implicit: bool = False,
+        alpha: float = 10.0,
+        cg_steps: int = 3,
+        block_nnz: int = 16384,
+        workers: Optional[int] = None,
+        seed: int = 42,
+    ):
+        self.factors = factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.implicit = implicit
+        self.alpha = alpha
+        self.cg_steps = cg_steps
+        self.block_nnz = block_nnz
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+
+        self.user_to_idx: Dict[str, int] = {}
+        self.book_to_idx: Dict[str, int] = {}
+        self.global_mean = 0.0
+        self.R: Optional[sp.csr_matrix] = None
+        self.user_factors: Optional[np.ndarray] = None
+        self.book_factors: Optional[np.ndarray] = None
+
+    def fit(self, interactions_df: pl.DataFrame, rating_col: str = "rating") -> "ALS":
+        """Train on interactions_df (user_id, book_id, rating_col)"""
+        users = interactions_df["user_id"].unique(maintain_order=True).to_list()
+        books = interactions_df["book_id"].unique(maintain_order=True).to_list()
+        self.user_to_idx = {u: i for i, u in enumerate(users)}
+        self.book_to_idx = {b: i for i, b in enumerate(books)}
+
+        rows = interactions_df["user_id"].replace_strict(self.user_to_idx).to_numpy()
+        cols = interactions_df["book_id"].replace_strict(self.book_to_idx).to_numpy()
+        ratings = interactions_df[rating_col].to_numpy().astype(np.float32)
+
+        self.global_mean = 0.0 if self.implicit else float(ratings.mean())
+        values = ratings if self.implicit else ratings - self.global_mean
+        self.R = sp.csr_matrix((values, (rows, cols)), shape=(len(users), len(books)), dtype=np.float32)
+        RT = self.R.T.tocsr()
+
+        rng = np.random.default_rng(self.seed)
+        self.user_factors = (rng.standard_normal((len(users), self.factors)) * 0.01).astype(np.float32)
+        self.book_factors = (rng.standard_normal((len(books), self.factors)) * 0.01).astype(np.float32)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            for it in range(self.iterations):
+                start = time.perf_counter()
+                self.user_factors = self._solve(self.R, self.book_factors, self.user_factors, ex)
+                self.book_factors = self._solve(RT, self.user_factors, self.book_factors, ex)
+                logger.info(f"ALS iteration {it + 1}/{self.iterations} in {time.perf_counter() - start:.2f}s")
+        return self
+
+    def predict(self, interactions_df: pl.DataFrame) -> np.ndarray:
+        """Predicted ratings for (user_id, book_id) pairs; unknown ids fall back to the global mean"""
+        u = interactions_df["user_id"].replace_strict(self.user_to_idx, default=-1).to_numpy()
+        b = interactions_df["book_id"].replace_strict(self.book_to_idx, default=-1).to_numpy()
+        known = (u >= 0) & (b >= 0)
+
+        preds = np.full(len(u), self.global_mean, dtype=np.float32)
+        preds[known] += np.einsum("ij,ij->i", self.user_factors[u[known]], self.book_factors[b[known]])
+        return np.clip(preds, 1, 5) if not self.implicit else preds
+
+    def evaluate(self, test_df: pl.DataFrame, rating_col: str = "rating") -> Dict[str, float]:
+        """RMSE / MAE on the 1-5 scale, comparable with the SVD and two-tower evaluations"""
+        preds = self.predict(test_df)
+        actual = test_df[rating_col].to_numpy().astype(np.float32)
+        return {
+            "rmse": float(np.sqrt(np.mean((preds - actual) ** 2))),
+            "mae": float(np.mean(np.abs(preds - actual))),
+        }
+
+    def to_artifacts(
+        self, metadata_df: Optional[pl.DataFrame] = None, history_df: Optional[pl.DataFrame] = None
+    ) -> ModelArtifacts:
+        """
+        Serving artifacts in the two-tower layout: L2-normalized factors, so the
+        Recommender ranks ALS and two-tower embeddings the same way.
+
+        history_df (user_id, book_id, rating) holds every rated interaction as
+        of training, as for export_two_tower. Without it no fingerprints are
+        stored and trained users are never folded in.
+        """
+        user_ids = list(self.user_to_idx)
+        book_ids = list(self.book_to_idx)
+
+        book_metadata = pl.DataFrame({"book_id": book_ids})
+        if metadata_df is not None:
+            cols = [c for c in METADATA_COLS if c in metadata_df.columns]
+            book_metadata = book_metadata.join(
+                metadata_df.select(["book_id"] + cols).unique("book_id"), on="book_id", how="left"
+            )
+        for col in METADATA_COLS:
+            if col not in book_metadata.columns:
+                book_metadata = book_metadata.with_columns(pl.lit(None).alias(col))
+
+        R = self.R.copy()
+        R.sort_indices()
+        return ModelArtifacts(
+            book_ids=book_ids,
+            book_embeddings=_normalize(self.book_factors),
+            n_ratings=np.diff(R.tocsc().indptr).astype(np.int64),
+            book_metadata=book_metadata.select(["book_id"] + METADATA_COLS),
+            user_ids=user_ids,
+            user_embeddings=_normalize(self.user_factors),
+            user_items_indptr=R.indptr.astype(np.int64),
+            user_items_indices=R.indices.astype(np.int32),
+            user_fingerprints=None if history_df is None else rating_fingerprints(history_df, user_ids, book_ids),
+        )
+
+    def _solve(self, R: sp.csr_matrix, Y: np.ndarray, X0: np.ndarray, ex: ThreadPoolExecutor) -> np.ndarray:
+        """New factors for every row of R with the column factors Y fixed; X0 are the current ones"""
+        counts = np.diff(R.indptr)
+        YtY = (Y.T @ Y) if self.implicit else None
+
+        # Rows sorted by rating count and cut into blocks of about block_nnz
+        # ratings (and at most block_nnz / factors rows), so rows in a block
+        # pad to similar lengths and per-block buffers stay block_nnz * factors
+        rows = np.flatnonzero(counts)
+        rows = rows[np.argsort(counts[rows], kind="stable")]
+        max_rows = max(1, self.block_nnz // self.factors)
+        splits = np.union1d(
+            np.flatnonzero(np.diff(np.cumsum(counts[rows]) // self.block_nnz)) + 1,
+            np.arange(max_rows, len(rows), max_rows),
+        )
+        blocks = [b for b in np.split(rows, splits) if len(b)]
+
+        X = X0.copy()
+        for block, factors in ex.map(lambda b: (b, self._solve_block(R[b], Y, YtY, X0[b])), blocks):
+            X[block] = factors
+        return X
+
+    def _solve_block(self, sub: sp.csr_matrix, Y: np.ndarray, YtY, x: np.ndarray) -> np.ndarray:
+        """Pad each row's ratings to the block's longest row and solve with batched GEMMs"""
+        counts = np.diff(sub.indptr)
+        n, width = len(counts), int(counts.max())
+        slot = np.arange(sub.nnz) - np.repeat(sub.indptr[:-1], counts)
+        row = np.repeat(np.arange(n), counts)
+
+        if self.implicit:
+            confidence = self.alpha * sub.data
+            w_gram, w_rhs = confidence, 1.0 + confidence
+        else:
+            w_gram, w_rhs = np.ones_like(sub.data), sub.data
+
+        Ysel = np.zeros((n, width, self.factors), dtype=np.float32)
+        Ysel[row, slot] = Y[sub.indices]
+        W = np.zeros((n, width), dtype=np.float32)
+        W[row, slot] = w_gram
+        r = np.zeros((n, width), dtype=np.float32)
+        r[row, slot] = w_rhs
+
+        YselT = Ysel.transpose(0, 2, 1)
+        A = YselT @ (Ysel * W[..., None])
+        b = (YselT @ r[..., None])[..., 0]
+
+        reg = self.regularization * (np.ones(n) if self.implicit else counts)
+        if YtY is not None:
+            A += YtY
+        diag = np.arange(self.factors)
+        A[:, diag, diag] += reg[:, None].astype(np.float32)
+        if not self.cg_steps:
+            return np.linalg.solve(A, b[..., None])[..., 0]
+
+        # Batched conjugate gradient warm-started from the current factors
+        r = b - (A @ x[..., None])[..., 0]
+        p = r.copy()
+        rs = np.einsum("ij,ij->i", r, r)
+        for _ in range(self.cg_steps):
+            Ap = (A @ p[..., None])[..., 0]
+            step = rs / np.maximum(np.einsum("ij,ij->i", p, Ap), 1e-20)
+            x = x + step[:, None] * p
+            r = r - step[:, None] * Ap
+            rs_new = np.einsum("ij,ij->i", r, r)
+            p = r + (rs_new / np.maximum(rs, 1e-20))[:, None] * p
+            rs = rs_new
+        return x
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.maximum(norms, 1e-8)).astype(np.float32)
@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+BOOKS_FILE = "books.parquet"
+USERS_FILE = "users.parquet"
+BOOK_EMBEDDINGS_FILE = "book_embeddings.npy"
+USER_EMBEDDINGS_FILE = "user_embeddings.npy"
+USER_ITEMS_FILE = "user_items.npz"
+MANIFEST_FILE = "manifest.json"
+
+# Columns copied from the book metadata into results
+METADATA_COLS = ["title", "image_url", "average_rating"]
+
+
+@dataclass
+class ModelArtifacts:
+    """Everything the serving path needs, detached from torch."""
+    book_ids: List[str]
+    book_embeddings: np.ndarray        # (num_books, dim), L2-normalized
+    n_ratings: np.ndarray              # (num_books,), interactions per book
+    book_metadata: pl.DataFrame        # book_id + METADATA_COLS, row-aligned
+    user_ids: List[str]
+    user_embeddings: np.ndarray        # (num_users, dim), L2-normalized
+    user_items_indptr: np.ndarray      # CSR over book rows, one row per user
+    user_items_indices: np.ndarray
+    user_fingerprints: Optional[np.ndarray] = None  # (num_users,) uint64, see rating_fingerprints
+
+    @property
+    def dim(self) -> int:
+        return self.book_embeddings.shape[1]
+
+
+def save_artifacts(artifacts: ModelArtifacts, model_dir: str):
+    """Write artifacts to model_dir in the layout load_artifacts expects"""
+    os.makedirs(model_dir, exist_ok=True)
+
+    books = artifacts.book_metadata.with_columns(
+        pl.Series("n_ratings", artifacts.n_ratings, dtype=pl.Int64)
+    )
+    books.write_parquet(os.path.join(model_dir, BOOKS_FILE))
+    pl.DataFrame({"user_id": artifacts.user_ids}).write_parquet(
+        os.path.join(model_dir, USERS_FILE)
+    )
+
+    np.save(os.path.join(model_dir, BOOK_EMBEDDINGS_FILE),
+            artifacts.book_embeddings.astype(np.float32))
+    np.save(os.path.join(model_dir, USER_EMBEDDINGS_FILE),
+            artifacts.user_embeddings.astype(np.float32))
+    user_items = {
+        "indptr": artifacts.user_items_indptr.astype(np.int64),
+        "indices": artifacts.user_items_indices.astype(np.int32),
+    }
+    if artifacts.user_fingerprints is not None:
+        user_items["fingerprints"] = artifacts.user_fingerprints.astype(np.uint64)
+    np.savez(os.path.join(model_dir, USER_ITEMS_FILE), **user_items)
+
+    with open(os.path.join(model_dir, MANIFEST_FILE), "w") as f:
+        json.dump({
+            "num_books": len(artifacts.book_ids),
+            "num_users": len(artifacts.user_ids),
+            "dim": artifacts.dim,
+        }, f)
+
+    logger.info(f"Saved artifacts for {len(artifacts.user_ids)} users and "
+                f"{len(artifacts.book_ids)} books to {model_dir}")
+
+
+def load_artifacts(model_dir: str) -> ModelArtifacts:
+    """Load artifacts written by save_artifacts / export_two_tower"""
+    books = pl.read_parquet(os.path.join(model_dir, BOOKS_FILE))
+    users = pl.read_parquet(os.path.join(model_dir, USERS_FILE))
+    user_items = np.load(os.path.join(model_dir, USER_ITEMS_FILE))
+
+    for col in METADATA_COLS:
+        if col not in books.columns:
+            books = books.with_columns(pl.lit(None).alias(col))
+
+    return ModelArtifacts(
+        book_ids=books["book_id"].to_list(),
+        book_embeddings=np.load(os.path.join(model_dir, BOOK_EMBEDDINGS_FILE)),
+        n_ratings=books["n_ratings"].to_numpy(),
+        book_metadata=books.select(["book_id"] + METADATA_COLS),
+        user_ids=users["user_id"].to_list(),
+        user_embeddings=np.load(os.path.join(model_dir, USER_EMBEDDINGS_FILE)),
+        user_items_indptr=user_items["indptr"],
+        user_items_indices=user_items["indices"],
+        # absent in exports that predate fingerprints
+        user_fingerprints=user_items["fingerprints"] if "fingerprints" in user_items.files else None,
+    )
+
+
+def build_user_items(interactions_df: pl.DataFrame, user_ids: List[str], book_ids: List[str]):
+    """
+    Build a CSR (indptr, indices) of the books each user has interacted with.
+
+    Rows follow user_ids, column indices point into book_ids. Interactions with
+    unknown users or books are dropped.
+    """
+    user_idx = pl.DataFrame({"user_id": user_ids, "u": np.arange(len(user_ids))})
+    book_idx = pl.DataFrame({"book_id": book_ids, "b": np.arange(len(book_ids))})
+
+    pairs = (
+        interactions_df.select(["user_id", "book_id"])
+        .join(user_idx, on="user_id", how="inner")
+        .join(book_idx, on="book_id", how="inner")
+        .sort(["u", "b"])
+    )
+    counts = np.bincount(pairs["u"].to_numpy(), minlength=len(user_ids))
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, pairs["b"].to_numpy().astype(np.int32)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: a well-spread, platform-independent uint64 hash"""
+    x = x.astype(np.uint64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def rating_fingerprint(book_rows: np.ndarray, ratings: np.ndarray) -> int:
+    """
+    Order-independent hash of one user's rated (book row, rating) pairs.
+    book_rows index the artifact's book_ids; ratings of 0 (unrated) are
+    skipped, so only changes that move a fold-in embedding change it.
+    """
+    ratings = np.rint(ratings).astype(np.int64)
+    rated = ratings > 0
+    return int(_mix64(np.asarray(book_rows, dtype=np.int64)[rated] * 8 + ratings[rated]).sum(dtype=np.uint64))
+
+
+def rating_fingerprints(history_df: pl.DataFrame, user_ids: List[str], book_ids: List[str]) -> np.ndarray:
+    """
+    rating_fingerprint for every user in user_ids over history_df (user_id,
+    book_id, rating); users without rated books get 0. The Recommender
+    compares these with the users' current rows to decide who to fold in.
+    """
+    user_idx = pl.DataFrame({"user_id": user_ids, "u": np.arange(len(user_ids))})
+    book_idx = pl.DataFrame({"book_id": book_ids, "b": np.arange(len(book_ids))})
+    rated = (
+        history_df.select(["user_id", "book_id", "rating"])
+        .filter(pl.col("rating") > 0)
+        .join(user_idx, on="user_id", how="inner")
+        .join(book_idx, on="book_id", how="inner")
+    )
+    h = _mix64(rated["b"].to_numpy().astype(np.int64) * 8 + rated["rating"].to_numpy().astype(np.int64))
+    fingerprints = np.zeros(len(user_ids), dtype=np.uint64)
+    np.add.at(fingerprints, rated["u"].to_numpy(), h)
+    return fingerprints
+
+
+def count_ratings(interactions_df: pl.DataFrame, book_ids: List[str]) -> np.ndarray:
+    """Per-book interaction counts (same definition as mv_popular_items.n_ratings)"""
+    counts = interactions_df.group_by("book_id").agg(pl.len().alias("n_ratings"))
+    return (
+        pl.DataFrame({"book_id": book_ids})
+        .join(counts, on="book_id", how="left")
+        ["n_ratings"].fill_null(0).to_numpy().astype(np.int64)
+    )
+
+
+def export_two_tower(
+    recommender,
+    interactions_df: pl.DataFrame,
+    model_dir: str,
+    batch_size: int = 4096,
+    image_urls: Optional[dict] = None,
+    history_df: Optional[pl.DataFrame] = None,
+) -> ModelArtifacts:
+    """
+    Export a trained notebook BookRecommender to serving artifacts.
+
+    Runs the user tower once for every known user so the API never needs
+    torch at request time.
+
+    Args:
+        recommender: BookRecommender from two_tower.ipynb (holds model, encoder,
+            book embeddings and user features)
+        interactions_df: Interactions used for training (user_id, book_id, ...)
+        model_dir: Output directory
+        batch_size: Users per user-tower forward pass
+        image_urls: Optional book_id -> cover image url
+        history_df: Every rated interaction as of training (user_id, book_id,
+            rating), before the train/val/test split; default interactions_df.
+            Users whose rated rows in the database still match it keep their
+            trained embedding instead of being folded in.
+    """
+    import torch
+    import torch.nn.functional as F
+
+    book_ids = list(recommender.book_ids)
+    book_embeddings = recommender.book_embeddings.detach().cpu().numpy().astype(np.float32)
+
+    user_ids = list(recommender.encoder.user_to_idx.keys())
+    default_feats = [0] * 5
+    user_embeddings = []
+
+    model = recommender.model.eval()
+    with torch.no_grad():
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            idx = torch.tensor([recommender.encoder.user_to_idx[u] for u in chunk],
+                               device=recommender.device)
+            feats = torch.tensor([recommender.user_features.get(u, default_feats) for u in chunk],
+                                 dtype=torch.float32, device=recommender.device)
+            emb = F.normalize(model.user_tower(idx, feats), p=2, dim=1)
+            user_embeddings.append(emb.cpu().numpy())
+
+    image_urls = image_urls or {}
+    meta = [recommender.book_metadata.get(b, {}) for b in book_ids]
+    book_metadata = pl.DataFrame({
+        "book_id": book_ids,
+        "title": [m.get("title") for m in meta],
+        "image_url": [image_urls.get(b, m.get("image_url")) for b, m in zip(book_ids, meta)],
+        "average_rating": [m.get("average_rating") for m in meta],
+    })
+
+    indptr, indices = build_user_items(interactions_df, user_ids, book_ids)
+    artifacts = ModelArtifacts(
+        book_ids=book_ids,
+        book_embeddings=book_embeddings,
+        n_ratings=count_ratings(interactions_df, book_ids),
+        book_metadata=book_metadata,
+        user_ids=user_ids,
+        user_embeddings=np.concatenate(user_embeddings).astype(np.float32),
+        user_items_indptr=indptr,
+        user_items_indices=indices,
+        user_fingerprints=rating_fingerprints(
+            interactions_df if history_df is None else history_df, user_ids, book_ids
+        ),
+    )
+    save_artifacts(artifacts, model_dir)
+    return artifacts
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when the batch queue is full; callers should shed load (503)"""
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into one call of a batch function.
+
+    Requests wait at most max_wait_ms for company, batches are capped at
+    max_batch, and the batch function runs on a bounded executor so the
+    event loop never blocks on inference. The queue is bounded: submit
+    raises Overloaded instead of letting latency grow without limit.
+
+    Args:
+        fn: Takes a list of items, returns one result (or Exception) per item
+        max_batch: Max items per call of fn
+        max_wait_ms: How long the first item of a batch waits for more
+        queue_size: Max queued items before submit raises Overloaded
+        workers: Number of batches computed concurrently
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+        queue_size: int = 1024,
+        workers: int = 1,
+    ):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue_size = queue_size
+        self.workers = workers
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self.batches = 0
+        self.items = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Fail anything still queued
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(Overloaded("batcher stopped"))
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Queue item and wait for its result; raises Overloaded or asyncio.TimeoutError"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f"inference queue full ({self.queue_size})")
+        return await asyncio.wait_for(future, timeout)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Skip requests whose caller already timed out
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.fn, items)
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {e}")
+                results = [e] * len(items)
+
+            self.batches += 1
+            self.items += len(items)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,333 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from modeling.artifacts import ModelArtifacts, load_artifacts, rating_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv("MODEL_DIR", "artifacts")
+
+# Unrated reads (rating 0) count as the user's mean rating, or this if nothing is rated
+UNRATED_RATING = 4.0
+
+
+class Recommender:
+    """
+    In-process serving engine over exported two-tower artifacts.
+
+    Books are stored in descending popularity order, so a popularity floor
+    (min_pop) plus a candidate cap is always a contiguous prefix of the
+    embedding matrix: candidate filtering is a slice, scoring is one matvec.
+
+    Users added or changed after training are folded in from their
+    interaction history (see fold_in) and kept in an LRU embedding cache
+    that takes precedence over the trained embeddings.
+
+    Args:
+        artifacts: Exported model
+        foldin_reg: Ridge penalty per rated book for fold_in
+        foldin_ttl: Seconds a fold-in cache entry stays valid
+        foldin_max_users: Max users in the fold-in cache
+    """
+
+    def __init__(
+        self,
+        artifacts: ModelArtifacts,
+        foldin_reg: float = 0.1,
+        foldin_ttl: float = 600.0,
+        foldin_max_users: int = 100_000,
+    ):
+        order = np.argsort(-artifacts.n_ratings, kind="stable")
+
+        # Book side, in popularity order
+        self.book_ids = [artifacts.book_ids[i] for i in order]
+        self.book_embeddings = np.ascontiguousarray(artifacts.book_embeddings[order], dtype=np.float32)
+        self.n_ratings = np.asarray(artifacts.n_ratings)[order]
+        self._neg_n_ratings = -self.n_ratings  # ascending, for searchsorted
+        self.book_metadata = [artifacts.book_metadata.row(int(i), named=True) for i in order]
+        self.book_to_row = {b: i for i, b in enumerate(self.book_ids)}
+        self._book_export_rows = order  # popularity-ordered row -> artifact row, for fingerprints
+
+        # rank[original_row] -> popularity-ordered row
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+
+        # User side
+        self.user_to_idx = {u: i for i, u in enumerate(artifacts.user_ids)}
+        self.user_embeddings = np.ascontiguousarray(artifacts.user_embeddings, dtype=np.float32)
+        self.user_items_indptr = artifacts.user_items_indptr
+        self.user_items_indices = rank[artifacts.user_items_indices]
+        self.user_fingerprints = artifacts.user_fingerprints
+        if self.user_fingerprints is None:
+            logger.warning("Artifacts have no user fingerprints: trained users are never folded in")
+
+        # Fold-in cache: user_id -> (expires_at, embedding, seen rows); a None
+        # embedding means the trained one is still current, None seen rows
+        # that the trained seen list is
+        self.foldin_reg = foldin_reg
+        self.foldin_ttl = foldin_ttl
+        self.foldin_max_users = foldin_max_users
+        self._folded = OrderedDict()
+        self._folded_lock = threading.Lock()
+
+        logger.info(f"Recommender ready: {len(self.user_to_idx)} users, "
+                    f"{len(self.book_ids)} books, dim={self.book_embeddings.shape[1]}")
+
+    def num_candidates(self, candidate_cap: int, min_pop: int) -> int:
+        """Number of leading (most popular) books that pass the popularity floor, capped"""
+        eligible = int(np.searchsorted(self._neg_n_ratings, -min_pop, side="right"))
+        return max(0, min(eligible, candidate_cap))
+
+    def user_embedding(self, user_id: str) -> np.ndarray:
+        """Folded-in or trained embedding; raises KeyError for users that are neither"""
+        entry = self._folded_entry(user_id)
+        if entry is not None and entry[1] is not None:
+            return entry[1]
+        return self.user_embeddings[self.user_to_idx[user_id]]
+
+    def seen_items(self, user_id: str) -> np.ndarray:
+        """Popularity-ordered rows of the books the user already interacted with"""
+        entry = self._folded_entry(user_id)
+        if entry is not None and entry[2] is not None:
+            return entry[2]
+        u = self.user_to_idx.get(user_id)
+        if u is None:
+            return np.empty(0, dtype=np.int32)
+        return self.user_items_indices[self.user_items_indptr[u]:self.user_items_indptr[u + 1]]
+
+    def needs_fold_in(self, user_id: str) -> bool:
+        """True until fold_in has checked the user's history within the last foldin_ttl seconds"""
+        return self._folded_entry(user_id) is None
+
+    def fold_in(self, user_id: str, history: Sequence[Tuple[str, Optional[float]]]) -> Optional[np.ndarray]:
+        """
+        Embed a user from their interaction history against the fixed book embeddings
+
+        Solves the ridge regression that the trained embeddings approximate,
+        score(book) = 2 * rating / 5 - 1 (the inverse of predicted_rating),
+        in closed form over the user's books, then L2-normalizes. A trained
+        user whose rated books and ratings still match the export fingerprint
+        keeps the trained embedding; unrated reads and history split off for
+        validation do not count as changes, but every history book is masked
+        as seen. The outcome is cached until foldin_ttl expires or
+        forget(user_id) is called.
+
+        Args:
+            user_id: Target user
+            history: (book_id, rating) pairs; books unknown to the model are ignored
+        Returns:
+            The folded-in embedding, None if the trained one is kept or no
+            history book is known to the model
+        """
+        rows = np.array([self.book_to_row[b] for b, _ in history if b in self.book_to_row], dtype=np.int32)
+        ratings = np.array([r or 0 for b, r in history if b in self.book_to_row], dtype=np.float32)
+
+        if len(rows) == 0:
+            self._store(user_id, None, None)
+            return None
+        if not self._changed_since_training(user_id, rows, ratings):
+            # unrated reads leave the fingerprint alone but must still be masked
+            self._store(user_id, None, np.sort(rows))
+            return None
+
+        rated = ratings > 0
+        ratings[~rated] = ratings[rated].mean() if rated.any() else UNRATED_RATING
+        target = 2 * ratings / 5 - 1
+
+        B = self.book_embeddings[rows]
+        A = B.T @ B
+        A[np.diag_indices_from(A)] += self.foldin_reg * len(rows)
+        emb = np.linalg.solve(A, B.T @ target)
+        emb = (emb / max(float(np.linalg.norm(emb)), 1e-8)).astype(np.float32)
+
+        self._store(user_id, emb, np.sort(rows))
+        return emb
+
+    def _changed_since_training(self, user_id: str, rows: np.ndarray, ratings: np.ndarray) -> bool:
+        """True for unknown users and for trained users whose rated books differ from the export"""
+        u = self.user_to_idx.get(user_id)
+        if u is None:
+            return True
+        if self.user_fingerprints is None:
+            return False
+        return rating_fingerprint(self._book_export_rows[rows], ratings) != int(self.user_fingerprints[u])
+
+    def forget(self, user_id: str):
+        """Drop a user's fold-in cache entry, e.g. after their interactions changed"""
+        with self._folded_lock:
+            self._folded.pop(user_id, None)
+
+    def _folded_entry(self, user_id: str):
+        with self._folded_lock:
+            entry = self._folded.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._folded[user_id]
+                return None
+            self._folded.move_to_end(user_id)
+            return entry
+
+    def _store(self, user_id: str, emb: Optional[np.ndarray], seen: Optional[np.ndarray]):
+        with self._folded_lock:
+            self._folded[user_id] = (time.monotonic() + self.foldin_ttl, emb, seen)
+            self._folded.move_to_end(user_id)
+            while len(self._folded) > self.foldin_max_users:
+                self._folded.popitem(last=False)
+
+    def topn(
+        self, user_id: str, n: int = 20, candidate_cap: int = 20000, min_pop: int = 50
+    ) -> List[Dict]:
+        """
+        Top-n unseen books for a user among popular candidates
+
+        Args:
+            user_id: Target user
+            n: Number of results
+            candidate_cap: Max number of (most popular) books to score
+            min_pop: Popularity floor on n_ratings
+        Returns:
+            List of result dicts ordered by relevance
+        """
+        user_emb = self.user_embedding(user_id)
+        k = self.num_candidates(candidate_cap, min_pop)
+        if k == 0 or n <= 0:
+            return []
+
+        return self._rank(user_id, self.book_embeddings[:k] @ user_emb, n)
+
+    def topn_batch(self, queries: List[Tuple[str, int, int, int]]) -> List[Union[List[Dict], Exception]]:
+        """
+        Score many (user_id, n, candidate_cap, min_pop) queries with one matmul
+
+        All users are scored against the largest candidate prefix in the batch;
+        each row is then cut back to its own prefix before ranking.
+
+        Returns:
+            One entry per query: a result list, or the KeyError for unknown users
+        """
+        out: List[Union[List[Dict], Exception]] = [[] for _ in queries]
+        rows, embs, ks = [], [], []
+        for i, (user_id, n, candidate_cap, min_pop) in enumerate(queries):
+            try:
+                emb = self.user_embedding(user_id)
+            except KeyError as e:
+                out[i] = e
+                continue
+            k = self.num_candidates(candidate_cap, min_pop)
+            if k and n > 0:
+                rows.append(i)
+                embs.append(emb)
+                ks.append(k)
+
+        if rows:
+            scores = np.stack(embs) @ self.book_embeddings[:max(ks)].T
+            for j, i in enumerate(rows):
+                user_id, n = queries[i][:2]
+                out[i] = self._rank(user_id, scores[j, :ks[j]], n)
+        return out
+
+    def topn_chunk(
+        self, chunk: Sequence[str], n: int = 20, candidate_cap: int = 20000, min_pop: int = 50
+    ) -> List[Dict]:
+        """
+        Top-n for a chunk of users (the bulk endpoint's unit of work)
+
+        One matmul, one scatter of seen-book masks and one row-wise
+        argpartition, so peak memory is about len(chunk) * candidates floats.
+
+        Returns:
+            A {"user_id", "results"} dict per user in input order; unknown
+            users get {"user_id", "error"} instead
+        """
+        k = self.num_candidates(candidate_cap, min_pop)
+        m = min(n, k)
+        candidates = self.book_embeddings[:k]
+        out = [{"user_id": user_id, "results": []} for user_id in chunk]
+
+        rows, embs = [], []
+        for i, user_id in enumerate(chunk):
+            try:
+                embs.append(self.user_embedding(user_id))
+                rows.append(i)
+            except KeyError:
+                out[i] = {"user_id": user_id, "error": "unknown user_id"}
+
+        if rows and m > 0:
+            scores = np.stack(embs) @ candidates.T
+
+            # Mask every user's seen books in one scatter
+            seen = [self.seen_items(chunk[i]) for i in rows]
+            seen_rows = np.repeat(np.arange(len(rows)), [len(s) for s in seen])
+            seen_cols = np.concatenate(seen) if seen else np.empty(0, dtype=np.int32)
+            keep = seen_cols < k
+            scores[seen_rows[keep], seen_cols[keep]] = -np.inf
+
+            top = np.argpartition(-scores, m - 1, axis=1)[:, :m]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for j, i in enumerate(rows):
+                out[i]["results"] = [
+                    self._result(b, float(sc))
+                    for b, sc in zip(top[j], top_scores[j]) if np.isfinite(sc)
+                ]
+
+        return out
+
+    def _rank(self, user_id: str, scores: np.ndarray, n: int) -> List[Dict]:
+        """Mask the user's seen books in scores (in place) and return the top n"""
+        seen = self.seen_items(user_id)
+        scores[seen[seen < len(scores)]] = -np.inf
+        return self._results(scores, n)
+
+    def _results(self, scores: np.ndarray, n: int) -> List[Dict]:
+        """Select the n best finite scores and attach metadata"""
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for i in top:
+            score = float(scores[i])
+            if not np.isfinite(score):
+                break
+            results.append(self._result(i, score))
+        return results
+
+    def _result(self, i: int, score: float) -> Dict:
+        """Result dict for popularity-ordered book row i"""
+        meta = self.book_metadata[i]
+        return {
+            "book_id": self.book_ids[i],
+            "relevance_score": score,
+            "predicted_rating": (score + 1) / 2 * 5,
+            "title": meta.get("title"),
+            "image_url": meta.get("image_url"),
+            "average_rating": meta.get("average_rating"),
+            "n_ratings": int(self.n_ratings[i]),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_recommender(model_dir: str = MODEL_DIR) -> Recommender:
+    """Load artifacts once per process"""
+    start = time.perf_counter()
+    recommender = Recommender(
+        load_artifacts(model_dir),
+        foldin_reg=float(os.getenv("FOLDIN_REG", "0.1")),
+        foldin_ttl=float(os.getenv("FOLDIN_TTL", "600")),
+        foldin_max_users=int(os.getenv("FOLDIN_MAX_USERS", "100000")),
+    )
+    logger.info(f"Loaded {model_dir} in {time.perf_counter() - start:.2f}s")
+    return recommender
+
@@ -0,0 +1,325 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import polars as pl
+import scipy.sparse as sp
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_DIR = os.getenv("SIMILAR_DIR", os.path.join(os.getenv("MODEL_DIR", "artifacts"), "similar"))
+
+ITEM_IDS_FILE = "item_ids.npy"
+NEIGHBORS_FILE = "neighbors.npy"
+SCORES_FILE = "scores.npy"
+META_FILE = "similar.json"
+
+# ItemSimilarityEngine state beyond the index, so update() can run in a later process
+USER_IDS_FILE = "user_ids.npy"
+MATRIX_FILE = "interactions.npz"
+
+
+def _replace(path: str, write):
+    """
+    Write through a temporary file and rename it over path. Readers that
+    mapped the old file keep its inode; they never see a truncated one.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class SimilarItems:
+    """
+    Top-K item-item neighbour lists in a fixed-width layout.
+
+    Row i of neighbors/scores holds book i's neighbours (padded with -1 / 0),
+    so a lookup is one dict probe plus a slice. save() writes plain .npy
+    files that load() maps read-only, shared between worker processes.
+    META_FILE is written last, so its change marks a complete new index
+    (see SimilarIndex).
+    """
+
+    def __init__(self, item_ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        self.item_ids = item_ids
+        self.neighbors = neighbors          # (num_items, top_k) int32, -1 = empty
+        self.scores = scores                # (num_items, top_k) float32, descending
+        self.item_to_row = {b: i for i, b in enumerate(item_ids.tolist())}
+
+    @property
+    def top_k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def similar(self, book_id: str, n: int = 20) -> List[Dict]:
+        """Up to n most similar books; raises KeyError for unknown books"""
+        row = self.item_to_row[book_id]
+        neighbors = self.neighbors[row, :n]
+        scores = self.scores[row, :n]
+        return [
+            {"book_id": str(self.item_ids[j]), "score": float(s)}
+            for j, s in zip(neighbors, scores) if j >= 0
+        ]
+
+    def save(self, out_dir: str, **meta):
+        os.makedirs(out_dir, exist_ok=True)
+        _replace(os.path.join(out_dir, ITEM_IDS_FILE), lambda f: np.save(f, self.item_ids.astype(str)))
+        _replace(os.path.join(out_dir, NEIGHBORS_FILE), lambda f: np.save(f, self.neighbors))
+        _replace(os.path.join(out_dir, SCORES_FILE), lambda f: np.save(f, self.scores))
+        meta = {"num_items": len(self.item_ids), "top_k": self.top_k, **meta}
+        _replace(os.path.join(out_dir, META_FILE), lambda f: f.write(json.dumps(meta).encode()))
+        logger.info(f"Saved {len(self.item_ids)} neighbour lists (k={self.top_k}) to {out_dir}")
+
+    @classmethod
+    def load(cls, in_dir: str, mmap: bool = True) -> "SimilarItems":
+        mode = "r" if mmap else None
+        index = cls(
+            np.load(os.path.join(in_dir, ITEM_IDS_FILE)),
+            np.load(os.path.join(in_dir, NEIGHBORS_FILE), mmap_mode=mode),
+            np.load(os.path.join(in_dir, SCORES_FILE), mmap_mode=mode),
+        )
+        # a save() running concurrently can leave files from two versions
+        if not len(index.item_ids) == len(index.neighbors) == len(index.scores):
+            raise ValueError(f"inconsistent similar-books index in {in_dir}")
+        return index
+
+
+class ItemSimilarityEngine:
+    """
+    Builds cosine item-item similarity from binary co-occurrence in the
+    user x book interaction matrix X:
+
+        sim(i, j) = |users(i) & users(j)| / sqrt(|users(i)| * |users(j)|)
+
+    X^T X is computed block_size books at a time on a thread pool (scipy's
+    sparse matmul releases the GIL), and each block is pruned to top_k
+    neighbours per book before the next one, so the full item x item
+    matrix is never materialized.
+
+    save() persists X and the id maps next to the index, and load() restores
+    them, so a scheduled job can run update() on new interactions without
+    refitting; serving processes pick the result up through SimilarIndex.
+
+    Args:
+        top_k: Neighbours kept per book
+        min_cooccurrence: Drop pairs read together by fewer users than this
+        block_size: Books per X^T X block
+        workers: Threads computing blocks in parallel
+    """
+
+    def __init__(
+        self,
+        top_k: int = 50,
+        min_cooccurrence: int = 2,
+        block_size: int = 1024,
+        workers: Optional[int] = None,
+    ):
+        self.top_k = top_k
+        self.min_cooccurrence = min_cooccurrence
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count()
+
+        self.user_to_idx: Dict[str, int] = {}
+        self.item_ids: List[str] = []
+        self.item_to_idx: Dict[str, int] = {}
+        self.X: Optional[sp.csr_matrix] = None
+        self.neighbors = np.empty((0, top_k), dtype=np.int32)
+        self.scores = np.empty((0, top_k), dtype=np.float32)
+
+    def fit(self, interactions_df: pl.DataFrame) -> "ItemSimilarityEngine":
+        """Build neighbour lists for every book in interactions_df (user_id, book_id)"""
+        self.user_to_idx, self.item_ids, self.item_to_idx = {}, [], {}
+        self.X = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._add_interactions(interactions_df)
+
+        n = len(self.item_ids)
+        self.neighbors = np.full((n, self.top_k), -1, dtype=np.int32)
+        self.scores = np.zeros((n, self.top_k), dtype=np.float32)
+        self._compute_rows(np.arange(n))
+
+        logger.info(f"Built item similarity for {n} books from {self.X.nnz} interactions")
+        return self
+
+    def update(self, new_interactions_df: pl.DataFrame) -> np.ndarray:
+        """
+        Fold new interactions in and recompute only the affected books: every
+        book read by a user who has new interactions.
+
+        Neighbour scores in untouched rows that point at an affected book are
+        left as they were (slightly high, since that book's reader count grew)
+        until the next fit().
+
+        Returns:
+            Rows that were recomputed
+        """
+        users = self._add_interactions(new_interactions_df)
+
+        n = len(self.item_ids)
+        grown = n - len(self.neighbors)
+        if grown:
+            self.neighbors = np.vstack([self.neighbors, np.full((grown, self.top_k), -1, dtype=np.int32)])
+            self.scores = np.vstack([self.scores, np.zeros((grown, self.top_k), dtype=np.float32)])
+
+        affected = np.unique(self.X[users].indices)
+        self._compute_rows(affected)
+        logger.info(f"Updated {len(affected)} of {n} books from {len(new_interactions_df)} interactions")
+        return affected
+
+    def index(self) -> SimilarItems:
+        return SimilarItems(np.array(self.item_ids, dtype=str), self.neighbors, self.scores)
+
+    def save(self, out_dir: str):
+        """Engine state first, then the index (whose META_FILE announces the update)"""
+        os.makedirs(out_dir, exist_ok=True)
+        user_ids = np.empty(len(self.user_to_idx), dtype=object)
+        for u, i in self.user_to_idx.items():
+            user_ids[i] = u
+        _replace(os.path.join(out_dir, USER_IDS_FILE), lambda f: np.save(f, user_ids.astype(str)))
+        _replace(os.path.join(out_dir, MATRIX_FILE), lambda f: sp.save_npz(f, self.X))
+        self.index().save(out_dir, min_cooccurrence=self.min_cooccurrence)
+
+    @classmethod
+    def load(cls, in_dir: str, **kwargs) -> "ItemSimilarityEngine":
+        """Restore an engine saved by save(); top_k and min_cooccurrence come from the saved index"""
+        with open(os.path.join(in_dir, META_FILE)) as f:
+            meta = json.load(f)
+        engine = cls(top_k=meta["top_k"], min_cooccurrence=meta.get("min_cooccurrence", 2), **kwargs)
+        index = SimilarItems.load(in_dir, mmap=False)
+        engine.item_ids = index.item_ids.tolist()
+        engine.item_to_idx = index.item_to_row
+        engine.neighbors, engine.scores = index.neighbors, index.scores
+        user_ids = np.load(os.path.join(in_dir, USER_IDS_FILE)).tolist()
+        engine.user_to_idx = {u: i for i, u in enumerate(user_ids)}
+        engine.X = sp.load_npz(os.path.join(in_dir, MATRIX_FILE)).tocsr()
+        return engine
+
+    def _add_interactions(self, interactions_df: pl.DataFrame) -> np.ndarray:
+        """Grow the id maps and X with new (user_id, book_id) pairs; returns touched user rows"""
+        pairs = interactions_df.select(["user_id", "book_id"]).unique()
+        users = pairs["user_id"].to_list()
+        books = pairs["book_id"].to_list()
+
+        for u in users:
+            if u not in self.user_to_idx:
+                self.user_to_idx[u] = len(self.user_to_idx)
+        for b in books:
+            if b not in self.item_to_idx:
+                self.item_to_idx[b] = len(self.item_ids)
+                self.item_ids.append(b)
+
+        rows = np.fromiter((self.user_to_idx[u] for u in users), dtype=np.int64, count=len(users))
+        cols = np.fromiter((self.item_to_idx[b] for b in books), dtype=np.int64, count=len(books))
+        shape = (len(self.user_to_idx), len(self.item_ids))
+
+        X = self.X.copy()
+        X.resize(shape)
+        X = X + sp.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+        X.data[:] = 1.0  # binary: repeated pairs count once
+        self.X = X.tocsr()
+        return np.unique(rows)
+
+    def _compute_rows(self, rows: np.ndarray):
+        X = self.X
+        XT = X.T.tocsr()
+        norms = np.sqrt(np.asarray(X.sum(axis=0)).ravel()).astype(np.float32)
+
+        blocks = [rows[i:i + self.block_size] for i in range(0, len(rows), self.block_size)]
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            for block, neighbors, scores in ex.map(lambda b: self._topk_block(XT, X, norms, b), blocks):
+                self.neighbors[block] = neighbors
+                self.scores[block] = scores
+
+    def _topk_block(self, XT, X, norms, block: np.ndarray):
+        co = (XT[block] @ X).tocoo()
+        r, c, count = co.row, co.col, co.data
+
+        keep = (c != block[r]) & (count >= self.min_cooccurrence)
+        r, c = r[keep], c[keep]
+        sim = count[keep] / (norms[block[r]] * norms[c])
+
+        # Sort each row by descending similarity, keep the first top_k
+        order = np.lexsort((c, -sim, r))
+        r, c, sim = r[order], c[order], sim[order]
+        row_start = np.searchsorted(r, np.arange(len(block)))
+        pos = np.arange(len(r)) - row_start[r]
+        keep = pos < self.top_k
+
+        neighbors = np.full((len(block), self.top_k), -1, dtype=np.int32)
+        scores = np.zeros((len(block), self.top_k), dtype=np.float32)
+        neighbors[r[keep], pos[keep]] = c[keep]
+        scores[r[keep], pos[keep]] = sim[keep]
+        return block, neighbors, scores
+
+
+class SimilarIndex:
+    """
+    The index a serving process answers from. Loaded lazily; get() returns
+    None while no index has been built. Every check_interval seconds, get()
+    stats META_FILE and maps the new files if a build or update replaced it,
+    so workers follow `python -m modeling.similarity update` without a restart.
+    """
+
+    def __init__(self, in_dir: str = SIMILAR_DIR, check_interval: float = 30.0):
+        self.in_dir = in_dir
+        self.check_interval = check_interval
+        self._index: Optional[SimilarItems] = None
+        self._version = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[SimilarItems]:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._reload()
+                    self._checked_at = time.monotonic()
+        return self._index
+
+    def _reload(self):
+        try:
+            st = os.stat(os.path.join(self.in_dir, META_FILE))
+        except FileNotFoundError:
+            return
+        version = (st.st_ino, st.st_mtime_ns)
+        if version == self._version:
+            return
+        try:
+            self._index = SimilarItems.load(self.in_dir)
+        except (OSError, ValueError) as e:
+            # mid-write; retried on the next check
+            logger.warning(f"Could not load similar-books index from {self.in_dir}: {e}")
+            return
+        self._version = version
+        logger.info(f"Loaded {len(self._index.item_ids)} neighbour lists from {self.in_dir}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Build or update the similar-books index from interactions")
+    parser.add_argument("command", choices=["build", "update"],
+                        help="build: fit from scratch; update: fold new interactions into the saved engine")
+    parser.add_argument("interactions", help="Parquet file with user_id, book_id (e.g. train_interactions)")
+    parser.add_argument("--out", default=SIMILAR_DIR)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--min-cooccurrence", type=int, default=2)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    interactions = pl.read_parquet(args.interactions, columns=["user_id", "book_id"])
+    if args.command == "build":
+        engine = ItemSimilarityEngine(
+            top_k=args.top_k, min_cooccurrence=args.min_cooccurrence,
+            block_size=args.block_size, workers=args.workers,
+        ).fit(interactions)
+    else:
+        engine = ItemSimilarityEngine.load(args.out, block_size=args.block_size, workers=args.workers)
+        engine.update(interactions)
+    engine.save(args.out)
@@ -11,6 +11,7 @@ from dataclasses import dataclass
 from typing import List, Optional
 import re
 from datetime import datetime
+from database.invalidation import invalidate_user
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -269,6 +270,10 @@ class GoodreadsUserInteractionsScraper:
         try:
             response = supabase.table("interactions").upsert(data).execute()
             logger.info(f"Saved {len(data)} interactions to Supabase.")
+
+            # Tell the API to drop cached recommendations for the affected users
+            for user_id in {inter.user_id for inter in interactions}:
+                invalidate_user(user_id)
         except Exception as e:
             logger.error(f"Failed to save interactions to Supabase: {e}")
 
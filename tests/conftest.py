@@ -0,0 +1,69 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from benchmarks.api_load import seed_database
+from benchmarks.synthetic import make_artifacts, make_interactions
+from modeling.artifacts import load_artifacts, save_artifacts
+from modeling.recommend import Recommender
+
+NUM_USERS, NUM_BOOKS, NUM_INTERACTIONS, DIM = 200, 300, 5_000, 16
+
+
+@pytest.fixture(scope="session")
+def interactions():
+    return make_interactions(NUM_USERS, NUM_BOOKS, NUM_INTERACTIONS, seed=3)
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory, interactions):
+    path = str(tmp_path_factory.mktemp("model"))
+    save_artifacts(make_artifacts(NUM_USERS, NUM_BOOKS, NUM_INTERACTIONS, DIM, seed=3, interactions=interactions), path)
+    return path
+
+
+@pytest.fixture
+def recommender(model_dir):
+    """Fresh per test, so fold-in state does not leak between tests"""
+    return Recommender(load_artifacts(model_dir))
+
+
+@pytest.fixture
+def user_history(interactions):
+    """user_id -> (book_id, rating) pairs, as fetch_user_history returns them"""
+    def history(user_id):
+        rows = interactions.filter(interactions["user_id"] == user_id)
+        return list(rows.select(["book_id", "rating"]).iter_rows())
+    return history
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch, interactions, model_dir, recommender):
+    """
+    api.main against a seeded SQLite file and the synthetic model, without a
+    shared cache tier. Returns an async context manager yielding (client, app).
+    """
+    import api.cache
+    import api.main
+
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'api.sqlite'}"
+    asyncio.run(seed_database(database_url, interactions, load_artifacts(model_dir).book_metadata))
+
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    monkeypatch.delenv("CACHE_URL", raising=False)
+    monkeypatch.setattr(api.main, "get_recommender", lambda: recommender)
+    api.cache.get_cache.cache_clear()
+
+    @asynccontextmanager
+    async def client():
+        app = api.main.app
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+                yield c, app
+
+    yield client
+    api.cache.get_cache.cache_clear()
+
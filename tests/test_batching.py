@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import pytest
+
+from modeling.batching import MicroBatcher, Overloaded
+
+
+class Gate:
+    """Batch function that records its batches and blocks until opened"""
+
+    def __init__(self, open_: bool = False):
+        self.batches = []
+        self.started = threading.Event()
+        self.opened = threading.Event()
+        if open_:
+            self.opened.set()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        self.opened.wait(5)
+        return [KeyError(i) if i == "bad" else i * 2 for i in items]
+
+    async def wait_started(self):
+        await asyncio.to_thread(self.started.wait, 5)
+        self.started.clear()
+
+
+def run(scenario, gate, **kwargs):
+    async def main():
+        batcher = MicroBatcher(gate, **kwargs)
+        await batcher.start()
+        try:
+            await scenario(batcher)
+        finally:
+            gate.opened.set()
+            await batcher.stop()
+    asyncio.run(main())
+
+
+def test_concurrent_items_share_a_batch():
+    gate = Gate(open_=True)
+
+    async def scenario(batcher):
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        assert results == [0, 2, 4, 6, 8]
+        assert gate.batches == [[0, 1, 2, 3, 4]]
+        assert batcher.stats()["mean_batch_size"] == 5
+
+    run(scenario, gate, max_wait_ms=50)
+
+
+def test_per_item_exception():
+    gate = Gate(open_=True)
+
+    async def scenario(batcher):
+        ok, bad = await asyncio.gather(batcher.submit(1), batcher.submit("bad"), return_exceptions=True)
+        assert ok == 2
+        assert isinstance(bad, KeyError)
+
+    run(scenario, gate, max_wait_ms=50)
+
+
+def test_full_queue_raises_overloaded():
+    gate = Gate()
+
+    async def scenario(batcher):
+        running = asyncio.create_task(batcher.submit(1))
+        await gate.wait_started()                    # worker busy with item 1
+        queued = asyncio.create_task(batcher.submit(2))
+        await asyncio.sleep(0)                       # item 2 fills the queue
+        with pytest.raises(Overloaded):
+            await batcher.submit(3)
+
+        gate.opened.set()
+        assert await running == 2
+        assert await queued == 4
+
+    run(scenario, gate, max_batch=1, queue_size=1)
+
+
+def test_timeout():
+    gate = Gate()
+
+    async def scenario(batcher):
+        with pytest.raises(asyncio.TimeoutError):
+            await batcher.submit(1, timeout=0.05)
+
+    run(scenario, gate)
+
+
+def test_timed_out_items_are_skipped():
+    gate = Gate()
+
+    async def scenario(batcher):
+        running = asyncio.create_task(batcher.submit(1))
+        await gate.wait_started()
+        with pytest.raises(asyncio.TimeoutError):
+            await batcher.submit(2, timeout=0.05)    # times out while still queued
+
+        gate.opened.set()
+        assert await running == 2
+        assert await batcher.submit(3) == 6
+        assert gate.batches == [[1], [3]]
+
+    run(scenario, gate, max_batch=1)
+
+
+def test_stop_fails_queued_items():
+    gate = Gate()
+
+    async def main():
+        batcher = MicroBatcher(gate, max_batch=1)
+        await batcher.start()
+        running = asyncio.create_task(batcher.submit(1))
+        await gate.wait_started()
+        queued = asyncio.create_task(batcher.submit(2))
+        await asyncio.sleep(0)
+
+        await batcher.stop()
+        gate.opened.set()
+        with pytest.raises(Overloaded):
+            await queued
+        running.cancel()
+
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from api.cache import MemoryBackend, ResponseCache, get_cache, user_tag
+
+
+class SharedMemory(MemoryBackend):
+    """Stand-in for RedisBackend: one store and one pub/sub channel shared by several caches"""
+
+    def __init__(self):
+        super().__init__()
+        self.subscribers = []
+
+    def publish(self, tag: str):
+        for callback in self.subscribers:
+            callback(tag)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+
+def test_memory_backend_tags():
+    backend = MemoryBackend()
+    backend.set("a", 1, ttl=60, tags=["user:1", "recommendations"])
+    backend.set("b", 2, ttl=60, tags=["user:2", "recommendations"])
+    backend.set("c", 3, ttl=60)
+
+    assert backend.invalidate("user:1") == 1
+    assert backend.get("a") is None and backend.get("b") == 2
+    assert backend.invalidate("recommendations") == 1
+    assert backend.get("b") is None and backend.get("c") == 3
+    assert backend.invalidate("user:1") == 0
+
+
+def test_memory_backend_ttl_and_lru():
+    backend = MemoryBackend(maxsize=2)
+    backend.set("old", 1, ttl=0.01, tags=["t"])
+    time.sleep(0.02)
+    assert backend.get("old") is None
+
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")
+    backend.set("c", 3, ttl=60)
+    assert backend.get("b") is None and backend.get("a") == 1 and backend.get("c") == 3
+
+
+def test_invalidate_drops_entries_and_notifies_listeners():
+    cache = ResponseCache()
+    seen = []
+    cache.add_listener(seen.append)
+    cache.set("recommendations", {"user_id": "1"}, {"r": 1}, ttl=60, tags=[user_tag("1")])
+    cache.set("recommendations", {"user_id": "2"}, {"r": 2}, ttl=60, tags=[user_tag("2")])
+
+    cache.invalidate(user_tag("1"))
+    assert cache.get("recommendations", {"user_id": "1"}) is None
+    assert cache.get("recommendations", {"user_id": "2"}) == {"r": 2}
+    assert seen == [user_tag("1")]
+
+
+def test_listen_without_shared_tier():
+    assert ResponseCache().listen() is False
+
+
+def test_invalidation_reaches_other_processes():
+    shared = SharedMemory()
+    writer, reader = ResponseCache(shared=shared), ResponseCache(shared=shared)
+    assert reader.listen()
+    forgotten = []
+    reader.add_listener(forgotten.append)
+
+    params = {"user_id": "1"}
+    writer.set("recommendations", params, {"r": 1}, ttl=60, tags=[user_tag("1")])
+    assert reader.get("recommendations", params) == {"r": 1}   # now also in reader's local tier
+
+    writer.invalidate(user_tag("1"))
+    assert reader.get("recommendations", params) is None
+    assert forgotten == [user_tag("1")]
+
+
+def test_api_forgets_fold_in_on_user_invalidation(api, recommender):
+    async def scenario():
+        async with api() as (client, app):
+            await client.get("/recommendations", params={"user_id": "7", "min_pop": 0})
+            assert not recommender.needs_fold_in("7")
+
+            get_cache().invalidate(user_tag("7"), broadcast=False)
+            assert recommender.needs_fold_in("7")
+
+    asyncio.run(scenario())
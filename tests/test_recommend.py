@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import numpy as np
+import polars as pl
+from sqlalchemy import text
+
+from api.cache import get_cache
+from modeling.artifacts import load_artifacts, rating_fingerprint, rating_fingerprints
+from modeling.recommend import Recommender
+
+
+def test_rating_fingerprints_match_per_user(interactions, user_history):
+    book_ids = sorted(interactions["book_id"].unique().to_list())
+    user_ids = sorted(interactions["user_id"].unique().to_list())[:50] + ["no-history"]
+    book_row = {b: i for i, b in enumerate(book_ids)}
+
+    # unrated reads must not move the fingerprint
+    unrated = pl.DataFrame({"user_id": user_ids[:10], "book_id": book_ids[:10], "rating": [0] * 10})
+    history = pl.concat([interactions, unrated.cast(interactions.schema)])
+    fingerprints = rating_fingerprints(history, user_ids, book_ids)
+
+    for u, user_id in enumerate(user_ids):
+        pairs = user_history(user_id)[::-1]  # order-independent
+        rows = np.array([book_row[b] for b, _ in pairs], dtype=np.int64)
+        ratings = np.array([r for _, r in pairs], dtype=np.float32)
+        assert rating_fingerprint(rows, ratings) == int(fingerprints[u])
+    assert fingerprints[-1] == 0
+
+
+def test_fold_in_keeps_unchanged_trained_user(recommender, user_history):
+    history = user_history("7")
+    trained = recommender.user_embeddings[recommender.user_to_idx["7"]]
+
+    assert recommender.fold_in("7", history) is None
+    np.testing.assert_array_equal(recommender.user_embedding("7"), trained)
+
+
+def test_fold_in_masks_new_unrated_reads(recommender, user_history):
+    history = user_history("7")
+    read = {b for b, _ in history}
+    new_book = next(b for b in recommender.book_ids if b not in read)
+
+    assert recommender.fold_in("7", history + [(new_book, 0)]) is None
+    assert recommender.book_to_row[new_book] in recommender.seen_items("7")
+    assert new_book not in [r["book_id"] for r in recommender.topn("7", n=50, min_pop=0)]
+
+
+def test_fold_in_changed_rating(recommender, user_history):
+    (book, rating), *rest = user_history("7")
+    changed = [(book, rating % 5 + 1)] + rest
+
+    emb = recommender.fold_in("7", changed)
+    assert emb is not None
+    np.testing.assert_array_equal(recommender.user_embedding("7"), emb)
+    assert abs(np.linalg.norm(emb) - 1) < 1e-5
+
+
+def test_fold_in_unknown_user(recommender, user_history):
+    assert "new-user" not in recommender.user_to_idx
+    emb = recommender.fold_in("new-user", user_history("7"))
+    assert emb is not None
+    assert recommender.topn("new-user", n=5, min_pop=0)
+
+
+def test_fold_in_without_known_books(recommender):
+    assert recommender.fold_in("new-user", [("not-a-book", 5)]) is None
+    assert not recommender.needs_fold_in("new-user")
+
+
+def test_fold_in_without_fingerprints_keeps_trained(model_dir, user_history):
+    artifacts = load_artifacts(model_dir)
+    artifacts.user_fingerprints = None
+    recommender = Recommender(artifacts)
+    (book, rating), *rest = user_history("7")
+
+    assert recommender.fold_in("7", [(book, rating % 5 + 1)] + rest) is None
+
+
+def test_forget_rechecks(recommender, user_history):
+    recommender.fold_in("7", user_history("7"))
+    assert not recommender.needs_fold_in("7")
+    recommender.forget("7")
+    assert recommender.needs_fold_in("7")
+
+
+def test_api_masks_unrated_read_after_invalidation(api):
+    async def scenario():
+        async with api() as (client, app):
+            params = {"user_id": "6", "n": 3, "min_pop": 0}
+            top = (await client.get("/recommendations", params=params)).json()["results"][0]["book_id"]
+
+            async with app.state.db.begin() as conn:
+                await conn.execute(
+                    text("INSERT INTO interactions (user_id, book_id, user_rating) VALUES ('6', :b, 0)"), {"b": top}
+                )
+            # what the scraper's invalidate_user delivers to every API process
+            get_cache().invalidate("user:6", broadcast=False)
+
+            results = (await client.get("/recommendations", params=params)).json()["results"]
+            assert top not in [r["book_id"] for r in results]
+
+    asyncio.run(scenario())
+
+
+def test_api_bulk_folds_in_new_users(api):
+    async def scenario():
+        async with api() as (client, app):
+            async with app.state.db.begin() as conn:
+                for book, rating in [("1", 5), ("2", 4), ("3", 1), ("4", None)]:
+                    await conn.execute(
+                        text("INSERT INTO interactions (user_id, book_id, user_rating) VALUES ('fresh', :b, :r)"),
+                        {"b": book, "r": rating},
+                    )
+
+            body = {"user_ids": ["fresh", "ghost"], "n": 5, "min_pop": 0}
+            lines = (await client.post("/recommendations/bulk", json=body)).text.splitlines()
+            fresh, ghost = [json.loads(line) for line in lines]
+            assert ghost == {"user_id": "ghost", "error": "unknown user_id"}
+
+            single = (await client.get("/recommendations", params={"user_id": "fresh", "n": 5, "min_pop": 0})).json()
+            assert [r["book_id"] for r in fresh["results"]] == [r["book_id"] for r in single["results"]]
+
+    asyncio.run(scenario())